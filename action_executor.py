@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4
+RETRIES = 2
+RETRY_DELAY = 2
+# No new attempt is started once an action has been running this long; the single requests are bounded by
+# their own HTTP timeouts
+RETRY_WINDOW = 60
+
+
+def call_directly(func):
+    func()
+
+
+class ActionExecutor:
+    def __init__(self, dispatch=call_directly, max_workers=MAX_WORKERS):
+        # dispatch(func) runs func on the thread that owns the UI, e.g. through Clock.schedule_once
+        self.dispatch = dispatch
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='Action')
+        self.running = {}
+        self.running_lock = threading.Lock()
+        self.listeners = []
+        self.stop_event = threading.Event()
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+    def running_names(self):
+        with self.running_lock:
+            return sorted(self.running)
+
+    def submit(self, name, func, *args, on_done=None, on_error=None, retries=RETRIES, retry_window=RETRY_WINDOW):
+        with self.running_lock:
+            if name in self.running:
+                print(f'{name} is already running')
+                return None
+            self.running[name] = time.monotonic()
+        self._emit_running()
+        return self.pool.submit(self._run, name, func, args, on_done, on_error, retries, retry_window)
+
+    def close(self, wait=True, cancel_futures=False):
+        # Actions already running finish their current attempt, but are not retried any more
+        self.stop_event.set()
+        self.pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def _run(self, name, func, args, on_done, on_error, retries, retry_window):
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                result = func(*args)
+            except Exception as e:
+                attempt += 1
+                if (attempt > retries or time.monotonic() - start + RETRY_DELAY > retry_window
+                        or self.stop_event.is_set()):
+                    print(f'{name} failed after {attempt} attempts:', e)
+                    self._finish(name, on_error, e)
+                    raise
+                print(f'{name} failed, retrying:', e)
+                self.stop_event.wait(RETRY_DELAY)
+            else:
+                print(f'{name} done in {time.monotonic() - start:.1f}s')
+                self._finish(name, on_done, result)
+                return result
+
+    def _finish(self, name, callback, value):
+        with self.running_lock:
+            self.running.pop(name, None)
+
+        def finish():
+            if callback:
+                callback(value)
+            for listener in self.listeners:
+                listener(self)
+        self.dispatch(finish)
+
+    def _emit_running(self):
+        def emit():
+            for listener in self.listeners:
+                listener(self)
+        self.dispatch(emit)
@@ -0,0 +1,261 @@
+import asyncio
+import collections
+import threading
+import time
+
+import aiohttp
+import socketio
+
+import checkpoint
+import game_log
+import games_watcher
+from games_watcher import log, log_status
+
+QUEUE_SIZE = 1000
+BLOCK_TIMEOUT = 5.0
+METRICS_INTERVAL = 60
+OVERFLOW_COALESCE = 'coalesce'
+OVERFLOW_BLOCK = 'block'
+
+_STOP = object()
+_RESYNC = object()
+
+
+class IngestQueue:
+    def __init__(self, maxsize=QUEUE_SIZE, overflow=OVERFLOW_COALESCE, block_timeout=BLOCK_TIMEOUT):
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.entries = collections.deque()
+        self.last_entry_by_game = {}
+        self.condition = threading.Condition()
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.over_limit = 0
+        self.max_depth = 0
+
+    def put(self, event, data):
+        with self.condition:
+            if len(self.entries) >= self.maxsize:
+                if self.overflow == OVERFLOW_COALESCE and self._coalesce(event, data):
+                    self.coalesced += 1
+                    return
+                self._wait_for_space()
+
+            entry = [event, data]
+            self.entries.append(entry)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self.entries))
+            if event == 'all games at once':
+                self.last_entry_by_game.clear()
+            else:
+                self.last_entry_by_game[data['public_id']] = entry
+            self.condition.notify_all()
+
+    def put_stop(self):
+        with self.condition:
+            self.entries.append([_STOP, None])
+            self.condition.notify_all()
+
+    def get(self):
+        with self.condition:
+            while not self.entries:
+                self.condition.wait()
+            entry = self.entries.popleft()
+            event, data = entry
+            if event not in (_STOP, 'all games at once') \
+                    and self.last_entry_by_game.get(data['public_id']) is entry:
+                del self.last_entry_by_game[data['public_id']]
+            self.condition.notify_all()
+            return event, data
+
+    def metrics(self):
+        with self.condition:
+            return {
+                'depth': len(self.entries),
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'coalesced': self.coalesced,
+                'blocked': self.blocked,
+                'blocked_time': self.blocked_time,
+                'over_limit': self.over_limit,
+            }
+
+    def _wait_for_space(self):
+        # Blocking the event loop stops it from reading the socket, which is the backpressure we want.
+        # The wait is bounded so the engine.io heartbeat doesn't time out.
+        start = time.monotonic()
+        self.blocked += 1
+        self.condition.wait_for(lambda: len(self.entries) < self.maxsize, self.block_timeout)
+        self.blocked_time += time.monotonic() - start
+        if len(self.entries) >= self.maxsize:
+            self.over_limit += 1
+
+    def _coalesce(self, event, data):
+        if event not in ('delta', 'alive'):
+            return False
+        entry = self.last_entry_by_game.get(data['public_id'])
+        if entry is None or entry[0] not in ('delta', 'alive'):
+            return False
+
+        earlier = as_delta(entry[0], entry[1])
+        later = as_delta(event, data)
+        if earlier['added'] or earlier['removed'] or later['removed'] \
+                or 'events' in earlier['modified'] or 'events' in later['modified']:
+            return False
+
+        entry[0] = 'delta'
+        entry[1] = {
+            'public_id': data['public_id'],
+            'modified': merge_modified(earlier['modified'], later['modified']),
+            'added': later['added'],
+            'removed': None,
+        }
+        return True
+
+
+def as_delta(event, data):
+    if event == 'alive':
+        return {'public_id': data['public_id'], 'modified': data, 'added': None, 'removed': None}
+    return {
+        'public_id': data['public_id'],
+        'modified': data['modified'] or {},
+        'added': data['added'],
+        'removed': data['removed'],
+    }
+
+
+def merge_modified(earlier, later):
+    merged = dict(earlier)
+    for key, value in later.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_modified(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class AsyncGamesWatcher(games_watcher.GamesWatcher):
+    def __init__(self, log_directory=game_log.LOG_DIRECTORY, checkpoint_name=checkpoint.CHECKPOINT_FILE_NAME,
+                 queue_size=QUEUE_SIZE, overflow=OVERFLOW_COALESCE, resync=True):
+        self.queue = IngestQueue(queue_size, overflow)
+        self.loop = None
+        self.loop_thread = None
+        self.consumer_thread = None
+        super().__init__(log_directory, checkpoint_name, resync)
+
+    def create_client(self):
+        sio = socketio.AsyncClient(logger=True)
+
+        @sio.event
+        async def connect():
+            log('Connected, authenticating...')
+            await sio.emit('auth', self.auth_payload())
+
+        @sio.event
+        async def connect_error(data):
+            log("The connection failed!", data)
+
+        @sio.event
+        async def disconnect():
+            log("The application disconnected.")
+
+        @sio.event
+        async def status(data):
+            log_status(data)
+
+        for event in self.handlers:
+            sio.on(event, self._receiver(event))
+
+        return sio
+
+    def _receiver(self, event):
+        # engine.io runs every message in its own task, so nothing here may await before the payload is queued,
+        # otherwise payloads could overtake each other
+        async def receive(data):
+            if self.recorder:
+                self.recorder.record(event, data)
+            self.queue.put(event, data)
+        return receive
+
+    def _consume(self):
+        while True:
+            event, data = self.queue.get()
+            if event is _STOP:
+                return
+            try:
+                if event is _RESYNC:
+                    self.dispatch('complete', data)
+                    self.resynced(data['public_id'])
+                    continue
+                self.dispatch(event, data)
+            except Exception as e:
+                log('Could not apply payload:', event, repr(e))
+
+    def apply_resync(self, public_id, data):
+        # Queued behind the payloads still waiting, so no older delta is applied on top of the fresh state
+        if self.recorder:
+            self.recorder.record('complete', data)
+        self.queue.put(_RESYNC, data)
+
+    def queue_metrics(self):
+        return self.queue.metrics()
+
+    async def _report_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            log('Ingest queue:', self.queue_metrics())
+
+    def start_tournament_id(self, tournament_id):
+        self._start(self.connect_tournament_id(tournament_id))
+
+    def start_public_id(self, public_id):
+        self._start(self.connect_public_id(public_id))
+
+    async def connect_public_id(self, public_id):
+        self.restore_checkpoint()
+        self.public_ids = [public_id]
+        await self._connect()
+
+    async def connect_tournament_id(self, tournament_id):
+        self.restore_checkpoint(tournament_id)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                f"{games_watcher.REMOTE_SERVER}administration/getAllTournamentPublicGameIdsAndTimes.php",
+                json={'tournament': str(tournament_id)}
+            ) as r:
+                response = await r.json(content_type=None)
+        self.tournament_id = tournament_id
+        self.public_ids = response['public_game_ids']
+        await self._connect()
+
+    async def _connect(self):
+        self.loop = asyncio.get_running_loop()
+        self.start_background_tasks()
+        if not self.consumer_thread:
+            self.consumer_thread = threading.Thread(target=self._consume, name='GamesWatcherConsumer', daemon=True)
+            self.consumer_thread.start()
+        await self.sio.connect(games_watcher.REMOTE_SERVER)
+
+    def _start(self, connect):
+        async def run():
+            await connect
+            reporter = asyncio.create_task(self._report_metrics())
+            await self.sio.wait()
+            reporter.cancel()
+
+        self.loop_thread = threading.Thread(target=asyncio.run, args=(run(),), name='GamesWatcherNetwork', daemon=True)
+        self.loop_thread.start()
+
+    def close(self):
+        if self.loop and self.sio.connected:
+            asyncio.run_coroutine_threadsafe(self.sio.disconnect(), self.loop).result(10)
+        if self.consumer_thread:
+            self.queue.put_stop()
+            self.consumer_thread.join(10)
+        if self.checkpointer:
+            self.checkpointer.close()
+        self.log_writer.close()
@@ -0,0 +1,110 @@
+import argparse
+import importlib.util
+import json
+import time
+
+import game
+import stream_recording
+
+
+class _BenchWatcher:
+    def __init__(self):
+        self.log_writer = self
+        self.emitted = 0
+
+    def write(self, file_name, header, line):
+        pass
+
+    def emit(self, event_game, event):
+        self.emitted += 1
+
+
+def apply_payload(game_data, event, data):
+    match event:
+        case 'delta':
+            game_data[data['public_id']].apply_change(data['modified'], data['added'], data['removed'])
+        case 'all games at once':
+            for payload in data['data']:
+                game_data[payload['public_id']].apply_change(payload, None, None)
+        case _:
+            game_data[data['public_id']].apply_change(data, None, None)
+
+
+def load_game_module(file_name):
+    global game
+    spec = importlib.util.spec_from_file_location('game', file_name)
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+
+
+def run(records):
+    watcher = _BenchWatcher()
+    game_data = {}
+    deltas = 0
+    elapsed = 0.0
+    delta_elapsed = 0.0
+    for _timestamp, event, data in records:
+        if event == 'public_ids':
+            game_data = {public_id: game.Game(watcher, public_id) for public_id in data['public_ids']}
+            continue
+        start = time.perf_counter()
+        apply_payload(game_data, event, data)
+        duration = time.perf_counter() - start
+        elapsed += duration
+        if event == 'delta':
+            deltas += 1
+            delta_elapsed += duration
+    return elapsed, delta_elapsed, deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the per-delta cost of Game.apply_change')
+    parser.add_argument('recording', help='a stream recording written by GamesWatcher.start_recording()')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--game-file', metavar='FILE',
+                        help='time another game.py instead, e.g. the baseline from `git show <rev>:game.py`')
+    parser.add_argument('--save', metavar='FILE', help='store the result, e.g. before a change to game.py')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against a result stored with --save')
+    args = parser.parse_args()
+
+    if args.game_file:
+        load_game_module(args.game_file)
+    records = list(stream_recording.read_recording(args.recording))
+    messages = sum(1 for record in records if record[1] != 'public_ids')
+    if not messages:
+        print('The recording contains no messages')
+        return
+    best = best_deltas = None
+    for _ in range(args.repeat):
+        elapsed, delta_elapsed, deltas = run(records)
+        best = elapsed if best is None else min(best, elapsed)
+        best_deltas = delta_elapsed if best_deltas is None else min(best_deltas, delta_elapsed)
+
+    result = {
+        'recording': args.recording,
+        'messages': messages,
+        'deltas': deltas,
+        'us_per_delta': best_deltas / deltas * 1e6 if deltas else None,
+        'us_per_message': best / messages * 1e6,
+    }
+    print(f"{messages} messages ({deltas} deltas), best of {args.repeat}: {best:.3f}s, "
+          f"{result['us_per_message']:.2f}us per message")
+    if deltas:
+        print(f"deltas only: {best_deltas:.3f}s, {result['us_per_delta']:.2f}us per delta")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['recording'] != args.recording or baseline['messages'] != messages:
+            print(f"Warning: the baseline was measured on {baseline['recording']} ({baseline['messages']} messages)")
+        for key, label in (('us_per_delta', 'per delta'), ('us_per_message', 'per message')):
+            if baseline.get(key) and result[key]:
+                print(f"{label}: {baseline[key]:.2f}us -> {result[key]:.2f}us "
+                      f"({(result[key] - baseline[key]) / baseline[key]:+.1%})")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import games_watcher
+import mock_server
+import startup
+import timekeeper_admin
+
+IMPORTED_MODULES = ('games_watcher', 'timekeeper_admin', 'googleapiclient.discovery', 'ui')
+DATA_TIMEOUT = 30
+
+
+class _BenchGamesList(timekeeper_admin.GamesList):
+    # Stands in for the Sheets read unless --real-sheet is given, since that needs the tournament's Google token
+    def __init__(self, sheet_latency):
+        self.sheet_latency = sheet_latency
+        super().__init__()
+
+    def import_all(self):
+        if self.sheet_latency is None:
+            return super().import_all()
+        time.sleep(self.sheet_latency)
+
+
+def import_time(module, repeat):
+    # Every measurement needs a fresh interpreter, as modules are only imported once per process
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    python_path = os.pathsep.join(filter(None, (os.path.dirname(os.path.abspath(__file__)),
+                                                os.environ.get('PYTHONPATH'))))
+    env = dict(os.environ, PYTHONPATH=python_path, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1')
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+        if result.returncode:
+            return None
+        seconds = float(result.stdout.split()[-1])
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def connect(watcher, tournament_id):
+    watcher.connect_tournament_id(tournament_id)
+    deadline = time.monotonic() + DATA_TIMEOUT
+    while not all(watched_game.data_available for watched_game in list(watcher.game_data.values())):
+        if time.monotonic() > deadline:
+            raise TimeoutError('not all games received data')
+        time.sleep(0.005)
+
+
+def run_serial(tournament_id, sheet_latency, log_directory):
+    start = time.perf_counter()
+    games_list = _BenchGamesList(sheet_latency)
+    games_list.load()
+    schedule = time.perf_counter() - start
+    watcher = games_watcher.GamesWatcher(log_directory=log_directory, checkpoint_name=None, resync=False)
+    try:
+        connect(watcher, tournament_id)
+    finally:
+        watcher.close()
+    return schedule, time.perf_counter() - start - schedule, time.perf_counter() - start
+
+
+def run_parallel(tournament_id, sheet_latency, log_directory):
+    startup_tasks = startup.Startup()
+    games_list = _BenchGamesList(sheet_latency)
+    watcher = games_watcher.GamesWatcher(log_directory=log_directory, checkpoint_name=None, resync=False)
+    try:
+        startup_tasks.run('schedule', games_list.load, retry_delay=0)
+        startup_tasks.run('quadball.live', connect, watcher, tournament_id, retry_delay=0)
+        startup_tasks.wait(DATA_TIMEOUT)
+    finally:
+        startup_tasks.close()
+        watcher.close()
+    status = startup_tasks.status()
+    ready = time.perf_counter() - startup_tasks.started
+    return status['schedule']['finished'], status['quadball.live']['finished'], ready
+
+
+def best_of(repeat, func, *args):
+    results = [func(*args) for _ in range(repeat)]
+    return min(results, key=lambda result: result[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup sequence against the local mock server')
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--sheet-latency', type=float, default=1.0,
+                        help='simulated seconds for the Sheets import')
+    parser.add_argument('--real-sheet', action='store_true', help='import the real schedule instead')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--port', type=int, default=mock_server.PORT)
+    args = parser.parse_args()
+
+    imports = {module: import_time(module, args.repeat) for module in IMPORTED_MODULES}
+    print('imports: ' + ', '.join(f"{module} {'-' if seconds is None else f'{seconds:.2f}s'}"
+                                  for module, seconds in imports.items()))
+
+    games_watcher.LOG_SIO = None
+    server = mock_server.MockServer(games=args.games, delta_rate=0, alive_interval=60)
+    mock_server.start_in_thread(server, port=args.port)
+    mock_server.use_mock_server(f"http://{mock_server.HOST}:{args.port}/")
+    logging.getLogger('socketio.client').setLevel(logging.WARNING)
+    logging.getLogger('engineio.client').setLevel(logging.WARNING)
+    sheet_latency = None if args.real_sheet else args.sheet_latency
+
+    with tempfile.TemporaryDirectory() as log_directory:
+        serial = best_of(args.repeat, run_serial, server.tournament_id, sheet_latency, log_directory)
+        parallel = best_of(args.repeat, run_parallel, server.tournament_id, sheet_latency, log_directory)
+
+    # Before, the window only opened once everything was imported, the schedule loaded and the games connected;
+    # now it opens right after the imports
+    ui_import = imports['ui'] or 0.0
+    for name, (schedule, connected, ready) in (('serial', serial), ('parallel', parallel)):
+        print(f"{name}: schedule {schedule:.2f}s, quadball.live {connected:.2f}s, ready after {ready:.2f}s")
+    print(f"window shown after ~{ui_import + serial[2]:.2f}s before, ~{ui_import:.2f}s now; "
+          f"games ready after ~{ui_import + serial[2]:.2f}s before, ~{max(ui_import, parallel[2]):.2f}s now")
+
+
+if __name__ == '__main__':
+    main()
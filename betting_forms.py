@@ -0,0 +1,172 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google_services
+import secrets
+
+FORM_TITLE_PREFIX = 'Tippspiel DQP 2023'
+TOKEN_ID = 'betting_form'
+MAX_WORKERS = 6
+SPLIT_KEYS = {
+    'pitch': lambda game: game.pitch,
+    'slot': lambda game: f"Slot {game.slot}",
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    # Kept for the whole run: google_services caches services per thread, so the same threads reuse their Forms and
+    # Drive clients and connections on every generation
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='BettingForm')
+    return _pool
+
+
+def group_games(games, split_by=None):
+    if not split_by:
+        return {None: list(games)}
+    key = SPLIT_KEYS[split_by]
+    groups = {}
+    for game in games:
+        groups.setdefault(key(game), []).append(game)
+    return groups
+
+
+def text_question(title, index, description=None):
+    item = {
+        'title': title,
+        'questionItem': {
+            'question': {
+                'required': True,
+                'textQuestion': {
+                    'paragraph': False,
+                },
+            },
+        },
+    }
+    if description:
+        item['description'] = description
+    return {'createItem': {'item': item, 'location': {'index': index}}}
+
+
+def question_requests(games, deadlines):
+    return [
+        text_question('Name', 0, 'Damit wir deine Antworten auch über mehrere Formulare zuordnen können.'),
+        text_question('Team', 1),
+    ] + [
+        {
+            'createItem': {
+                'item': {
+                    'title': game.german_description,
+                    'description': deadlines and f"Deadline: {game.time:%H:%M}" or '',
+                    'questionItem': {
+                        'question': {
+                            'required': True,
+                            'choiceQuestion': {
+                                'type': 'RADIO',
+                                'options': [
+                                    {'value': game.team_a["name"]},
+                                    {'value': game.team_b["name"]},
+                                ]
+                            },
+                        },
+                    },
+                },
+                'location': {'index': index + 2},
+            },
+        } for index, game in enumerate(games)
+    ]
+
+
+def create_form(title):
+    service = google_services.get_service('forms', 'v1', TOKEN_ID)
+    new_form = {
+        'info': {
+            'title': f'{FORM_TITLE_PREFIX} – {title}',
+            'document_title': title,
+        }
+    }
+    return google_services.execute(service.forms().create(body=new_form))
+
+
+def add_questions(form_id, games, deadlines):
+    service = google_services.get_service('forms', 'v1', TOKEN_ID)
+    return google_services.execute(service.forms().batchUpdate(
+        formId=form_id, body={'requests': question_requests(games, deadlines)}))
+
+
+def execute_batch(service, name, requests):
+    # One multipart HTTP request for all calls; the responses are collected per request id
+    responses = {}
+    errors = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for request_id, request in requests.items():
+        batch.add(request, request_id=request_id)
+    start = time.perf_counter()
+    batch.execute()
+    google_services.record_timing(f"batch {name}", time.perf_counter() - start)
+    if errors:
+        raise next(iter(errors.values()))
+    return responses
+
+
+def move_to_folder(form_ids, folder=None):
+    folder = folder or secrets.BETTING_FORM_FOLDER
+    drive_service = google_services.get_service('drive', 'v3', TOKEN_ID)
+    files = execute_batch(drive_service, 'drive.files.get', {
+        form_id: drive_service.files().get(fileId=form_id, fields='parents') for form_id in form_ids
+    })
+    return execute_batch(drive_service, 'drive.files.update', {
+        form_id: drive_service.files().update(
+            fileId=form_id, addParents=folder, removeParents=",".join(files[form_id].get('parents', [])),
+            fields="id, parents")
+        for form_id in form_ids
+    })
+
+
+def announcement(games, responder_uri, deadlines):
+    text_response_games = "\n".join(
+        f"{game.team_a['name']} – {game.team_b['name']}{deadlines and f' (Deadline: {game.time:%H:%M})' or ''}"
+        for game in games)
+    return f"""Es gibt ein neues Formular für die folgenden Spiele:
+{text_response_games}
+
+Jetzt tippen unter {responder_uri}"""
+
+
+def create_betting_forms(games, form_title, deadlines=False, split_by=None):
+    # Returns the announcement and (game, responder uri) pairs; the caller stores the links, as the games may have
+    # been replaced by a re-import in the meantime
+    groups = [(key, group) for key, group in group_games(games, split_by).items() if group]
+    if not groups:
+        return None, []
+    titles = [key and f"{form_title} – {key}" or form_title for key, _group in groups]
+
+    created = list(pool().map(create_form, titles))
+    form_ids = [result['formId'] for result in created]
+    # Questions and the Drive move touch different APIs and don't depend on each other
+    questions = [pool().submit(add_questions, form_id, group, deadlines)
+                 for form_id, (_key, group) in zip(form_ids, groups)]
+    move_to_folder(form_ids)
+    for future in questions:
+        future.result()
+
+    texts = []
+    links = []
+    for result, (_key, group) in zip(created, groups):
+        links += [(game, result['responderUri']) for game in group]
+        texts.append(announcement(group, result['responderUri'], deadlines))
+    return "\n\n".join(texts), links
@@ -0,0 +1,79 @@
+import os
+import pickle
+import threading
+import time
+
+CHECKPOINT_FILE_NAME = 'checkpoint.pickle'
+CHECKPOINT_INTERVAL = 5
+CHECKPOINT_VERSION = 1
+
+
+def dumps(watcher):
+    with watcher.state_lock:
+        return pickle.dumps({
+            'version': CHECKPOINT_VERSION,
+            'time': time.time(),
+            'tournament_id': watcher.tournament_id,
+            'public_ids': watcher.public_ids,
+            'games': {public_id: game.snapshot() for public_id, game in watcher.game_data.items()},
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def save(watcher, file_name):
+    data = dumps(watcher)
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    temporary_file = f"{file_name}.tmp"
+    with open(temporary_file, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_file, file_name)
+
+
+def load(file_name):
+    try:
+        with open(file_name, 'rb') as f:
+            checkpoint = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+        print('Could not read checkpoint:', e)
+        return None
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+class Checkpointer:
+    def __init__(self, watcher, file_name, interval=CHECKPOINT_INTERVAL):
+        self.watcher = watcher
+        self.file_name = file_name
+        self.interval = interval
+        self.saved_changes = watcher.changes
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='Checkpointer', daemon=True)
+            self.thread.start()
+
+    def save_if_changed(self):
+        changes = self.watcher.changes
+        if changes == self.saved_changes:
+            return
+        try:
+            save(self.watcher, self.file_name)
+            self.saved_changes = changes
+        except OSError as e:
+            print('Could not write checkpoint:', e)
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.save_if_changed()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.save_if_changed()
@@ -0,0 +1,148 @@
+import threading
+from array import array
+
+EVENT_TYPES = ('score', 'timeout', 'snitch', 'snitch_under_review', 'penalty')
+NUMBER_COLUMNS = ('period', 'gametime', 'increment')
+STRING_COLUMNS = ('team', 'player_number', 'player_name', 'color', 'reason')
+COLUMNS = NUMBER_COLUMNS + STRING_COLUMNS
+
+# Values that don't fit their typed column (floats, huge ints, non-string ids, ...) are kept in EventStore.other
+MISSING = -2 ** 63
+OTHER_STRING = -1
+
+# Team letters, player names and card colours repeat across all games, so they share one table
+_strings = [None]
+_string_ids = {None: 0}
+_strings_lock = threading.Lock()
+
+
+def intern_string(value):
+    string_id = _string_ids.get(value)
+    if string_id is None:
+        with _strings_lock:
+            string_id = _string_ids.get(value)
+            if string_id is None:
+                string_id = len(_strings)
+                _strings.append(value)
+                _string_ids[value] = string_id
+    return string_id
+
+
+class EventStore:
+    __slots__ = ('period', 'gametime', 'increment', 'team', 'player_number', 'player_name', 'color', 'reason',
+                 'removed', 'other', 'order')
+
+    def __init__(self):
+        self.period = array('q')
+        self.gametime = array('q')
+        self.increment = array('q')
+        self.team = array('i')
+        self.player_number = array('i')
+        self.player_name = array('i')
+        self.color = array('i')
+        self.reason = array('i')
+        self.removed = bytearray()
+        self.other = {}
+        self.order = {event_type: array('q') for event_type in EVENT_TYPES}
+
+    def __len__(self):
+        return len(self.removed)
+
+    def append(self, event_type, data):
+        order = self.order[event_type]
+        slot = len(self.removed)
+        for column in NUMBER_COLUMNS:
+            value = data.get(column)
+            getattr(self, column).append(self._encode_number(column, slot, value))
+        for column in STRING_COLUMNS:
+            value = data.get(column)
+            getattr(self, column).append(self._encode_string(column, slot, value))
+        self.removed.append(0)
+        order.append(slot)
+        return slot
+
+    def modify(self, slot, data):
+        for column, value in data.items():
+            if column in NUMBER_COLUMNS:
+                self.other.pop((column, slot), None)
+                getattr(self, column)[slot] = self._encode_number(column, slot, value)
+            elif column in STRING_COLUMNS:
+                self.other.pop((column, slot), None)
+                getattr(self, column)[slot] = self._encode_string(column, slot, value)
+
+    def remove(self, event_type, index):
+        order = self.order[event_type]
+        slot = order[index]
+        del order[index]
+        self.removed[slot] = 1
+        return slot
+
+    def clear(self, event_type):
+        order = self.order[event_type]
+        slots = order.tolist()
+        for slot in slots:
+            self.removed[slot] = 1
+        del order[:]
+        return slots
+
+    def value(self, column, slot):
+        stored = getattr(self, column)[slot]
+        if column in NUMBER_COLUMNS:
+            if stored == MISSING:
+                return self.other.get((column, slot))
+            return stored
+        if stored == OTHER_STRING:
+            return self.other[(column, slot)]
+        return _strings[stored]
+
+    def increment_totals(self, event_type):
+        totals = {}
+        increment = self.increment
+        team = self.team
+        for slot in self.order[event_type]:
+            value = increment[slot]
+            if value == MISSING:
+                value = self.other.get(('increment', slot))
+                if not isinstance(value, (int, float)):
+                    continue
+            team_id = team[slot]
+            team_value = self.other[('team', slot)] if team_id == OTHER_STRING else _strings[team_id]
+            totals[team_value] = totals.get(team_value, 0) + value
+        return totals
+
+    def row(self, slot):
+        return tuple(self.value(column, slot) for column in COLUMNS)
+
+    def __getstate__(self):
+        # String ids are only valid within this process, so the strings themselves are stored
+        return {
+            'numbers': {column: getattr(self, column) for column in NUMBER_COLUMNS},
+            'strings': {column: [self.value(column, slot) for slot in range(len(self.removed))]
+                        for column in STRING_COLUMNS},
+            'other': {key: value for key, value in self.other.items() if key[0] in NUMBER_COLUMNS},
+            'removed': self.removed,
+            'order': self.order,
+        }
+
+    def __setstate__(self, state):
+        for column, values in state['numbers'].items():
+            setattr(self, column, array('q', values))
+        self.other = dict(state['other'])
+        for column, values in state['strings'].items():
+            setattr(self, column, array('i', (
+                self._encode_string(column, slot, value) for slot, value in enumerate(values))))
+        self.removed = bytearray(state['removed'])
+        self.order = {event_type: array('q', slots) for event_type, slots in state['order'].items()}
+
+    def _encode_number(self, column, slot, value):
+        if type(value) is int and MISSING < value < 2 ** 63:
+            return value
+        if value is not None:
+            self.other[(column, slot)] = value
+        return MISSING
+
+    def _encode_string(self, column, slot, value):
+        if value is None or type(value) is str:
+            return intern_string(value)
+        self.other[(column, slot)] = value
+        return OTHER_STRING
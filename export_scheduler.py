@@ -0,0 +1,177 @@
+import threading
+import time
+
+RETRY_DELAY = 15
+FLUSH_TIMEOUT = 60
+
+
+class ExportTarget:
+    def __init__(self, name, func, debounce, max_latency, then=()):
+        self.name = name
+        self.func = func
+        self.debounce = debounce
+        self.max_latency = max_latency
+        # targets scheduled once this one succeeded, e.g. the live admin export after a re-import
+        self.then = then
+        self.first_requested = None
+        self.due = None
+        self.in_flight = False
+        self.last_success = None
+        self.last_error = None
+
+    def status(self):
+        return {
+            'pending': self.due is not None,
+            'due': self.due,
+            'in_flight': self.in_flight,
+            'last_success': self.last_success,
+            'last_error': self.last_error,
+        }
+
+
+class ExportScheduler:
+    def __init__(self):
+        self.targets = {}
+        self.status_listeners = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+        self.flushing = False
+        # Targets passed over while flushing, and whether a flushed target failed
+        self.flush_skip = ()
+        self.flush_failed = False
+
+    def add_target(self, name, func, debounce, max_latency, then=()):
+        self.targets[name] = ExportTarget(name, func, debounce, max_latency, then)
+
+    def listen(self, callback):
+        self.status_listeners.append(callback)
+
+    def schedule(self, name, delay=None):
+        target = self.targets[name]
+        now = time.monotonic()
+        with self.condition:
+            if target.first_requested is None:
+                target.first_requested = now
+            # Every request pushes the export back by the debounce window, but never beyond max_latency after the
+            # first request that is still waiting
+            target.due = min(now + (target.debounce if delay is None else delay),
+                             target.first_requested + target.max_latency)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='ExportScheduler', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+        self.emit_status()
+
+    def status(self):
+        with self.condition:
+            return {name: target.status() for name, target in self.targets.items()}
+
+    def status_text(self):
+        now = time.time()
+        parts = []
+        for name, status in self.status().items():
+            if status['in_flight']:
+                state = 'running'
+            elif status['pending']:
+                state = f"in {max(status['due'] - time.monotonic(), 0):.0f}s"
+            elif status['last_error']:
+                state = 'failed'
+            else:
+                state = 'idle'
+            if status['last_success']:
+                state += f", ok {now - status['last_success']:.0f}s ago"
+            parts.append(f"{name}: {state}")
+        return ' | '.join(parts)
+
+    def emit_status(self):
+        for callback in self.status_listeners:
+            callback(self)
+
+    def flush(self, timeout=FLUSH_TIMEOUT, skip=()):
+        # Runs everything still pending right away, including the targets the finished ones schedule, so nothing
+        # confirmed just before closing is lost. Failed targets are not retried meanwhile. Skipped targets are not
+        # run, but still schedule the targets that follow them.
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            if self.thread is None:
+                return True
+            self.flushing = True
+            self.flush_skip = skip
+            self.flush_failed = False
+            self.condition.notify_all()
+            try:
+                while any(target.due is not None or target.in_flight for target in self.targets.values()):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        print('Exports still pending after flushing:', self.status_text())
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.flushing = False
+                self.flush_skip = ()
+            if self.flush_failed:
+                print('Exports failed while flushing:', self.status_text())
+                return False
+        return True
+
+    def close(self, flush=True, skip=()):
+        if flush:
+            self.flush(skip=skip)
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+
+    def _next_due(self):
+        # A target waits while anything that schedules it is still pending, so a re-import never overtakes the
+        # sheet write it is meant to follow
+        blocked = {name for target in self.targets.values() if target.due is not None or target.in_flight
+                   for name in target.then}
+        pending = [target for target in self.targets.values() if target.due is not None and target.name not in blocked]
+        return min(pending, key=lambda target: target.due, default=None)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.stopped:
+                        return
+                    target = self._next_due()
+                    timeout = target and (0 if self.flushing else target.due - time.monotonic())
+                    if target and timeout <= 0:
+                        break
+                    self.condition.wait(timeout)
+                target.due = None
+                target.first_requested = None
+                if self.flushing and target.name in self.flush_skip:
+                    for name in target.then:
+                        self.schedule(name)
+                    self.condition.notify_all()
+                    continue
+                target.in_flight = True
+            self.emit_status()
+
+            try:
+                target.func()
+            except Exception as e:
+                print(f'Export {target.name} failed:', e)
+                with self.condition:
+                    target.in_flight = False
+                    target.last_error = str(e)
+                    flushing = self.flushing
+                    self.flush_failed = self.flush_failed or flushing
+                    self.condition.notify_all()
+                if not flushing:
+                    self.schedule(target.name, delay=RETRY_DELAY)
+                continue
+
+            with self.condition:
+                target.in_flight = False
+                target.last_success = time.time()
+                target.last_error = None
+                for name in target.then:
+                    self.schedule(name)
+                self.condition.notify_all()
+            self.emit_status()
@@ -1,8 +1,64 @@
 import datetime
-from os import path
+import json
+import time
+
+import event_store
+import metrics
+
+STATE_LOG_CSV = False
+JOURNAL_KEYFRAME_INTERVAL = 200
+
+STATE_LOG_HEADER = "Time,PublicId,DataAvailable,AliveTimestamp,Cancelled,Suspended,GT Last Stop,GT Last Start," \
+                   "GT Running,in overtime,OT Set Score,GameOver,Winner,Forfeit,Concede," \
+                   "NameA,IdA,QP Regular A,QP OT A,QP Concede A,SnitchCaughtA,SnitchPointsA,PointsTotalA," \
+                   "NameB,IdB,QP Regular B,QP OT B,QP Concede B,SnitchCaughtB,SnitchPointsB,PointsTotalB\n"
+STATE_FIELDS = (
+    (None, 'public_id'),
+    (None, 'data_available'),
+    (None, 'alive_timestamp'),
+    (None, 'cancelled'),
+    (None, 'suspended'),
+    (None, 'gametime_last_stop'),
+    (None, 'gametime_last_start'),
+    (None, 'gametime_running'),
+    (None, 'in_overtime'),
+    (None, 'overtime_setscore'),
+    (None, 'game_over'),
+    (None, 'winner'),
+    (None, 'forfeit'),
+    (None, 'concede'),
+    ('A', 'name'),
+    ('A', 'id'),
+    ('A', 'quaffel_points_regular'),
+    ('A', 'quaffel_points_overtime'),
+    ('A', 'quaffel_points_concede'),
+    ('A', 'snitch_caught'),
+    ('A', 'snitch_points'),
+    ('A', 'points_total'),
+    ('B', 'name'),
+    ('B', 'id'),
+    ('B', 'quaffel_points_regular'),
+    ('B', 'quaffel_points_overtime'),
+    ('B', 'quaffel_points_concede'),
+    ('B', 'snitch_caught'),
+    ('B', 'snitch_points'),
+    ('B', 'points_total'),
+)
+STATE_INDICES = range(len(STATE_FIELDS))
+JOURNAL_ENCODER = json.JSONEncoder(separators=(',', ':'))
+JOURNAL_HEADER = json.dumps(['h', 1, STATE_LOG_HEADER.rstrip().split(',')[1:]], separators=(',', ':')) + '\n'
+EVENT_LOG_HEADER = "Time,What,Type,Index,Period,Gametime,Team,P-Number,P-Name,Increment,Color,Reason\n"
 
 
 class Game:
+    __slots__ = (
+        'watcher', 'public_id', 'cancelled', 'suspended', 'data_available', 'alive_timestamp', 'teams',
+        'gametime_last_stop', 'gametime_last_start', 'gametime_running', 'game_over', 'winner', 'in_overtime',
+        'overtime_setscore', 'forfeit', 'concede', 'events', 'score_events', 'timeout_events', 'snitch_events',
+        'snitch_under_review_events', 'penalty_events', 'events_by_type', 'scheduled_events', 'journal_state',
+        'journal_records_since_keyframe',
+    )
+
     def __init__(self, watcher, public_id):
         self.watcher = watcher
         self.public_id = public_id
@@ -25,103 +81,147 @@ class Game:
         self.forfeit = None
         self.concede = None
 
-        self.score_events = []
-        self.timeout_events = []
-        self.snitch_events = []
-        self.snitch_under_review_events = []
-        self.penalty_events = []
+        self.events = event_store.EventStore()
+        self.score_events = EventList(self.events, 'score', ScoreEvent)
+        self.timeout_events = EventList(self.events, 'timeout', TimeoutEvent)
+        self.snitch_events = EventList(self.events, 'snitch', SnitchEvent)
+        self.snitch_under_review_events = EventList(self.events, 'snitch_under_review', SnitchUnderReviewEvent)
+        self.penalty_events = EventList(self.events, 'penalty', PenaltyEvent)
+        self.events_by_type = {
+            'score': self.score_events,
+            'timeout': self.timeout_events,
+            'snitch': self.snitch_events,
+            'snitch_under_review': self.snitch_under_review_events,
+            'penalty': self.penalty_events,
+        }
 
         self.scheduled_events = []
 
+        self.journal_state = None
+        self.journal_records_since_keyframe = 0
+
     def apply_change(self, modified, added, removed):
-        modified = modified or {}
-        for key, value in modified.items():
-            match key:
-                case 'cancelled_reason':
-                    self.cancelled = value
-                case 'suspended_reason':
-                    self.suspended = value
-                case 'data_available':
-                    old_value = self.data_available
-                    self.data_available = value
-                    if old_value != value:
-                        self.emit_event('data_available', value)
-                case 'alive_timestamp':
-                    self.alive_timestamp = value
-                case 'teams':
-                    if 'A' in value:
-                        self.teams['A'].apply_team_change(value['A'])
-                    if 'B' in value:
-                        self.teams['B'].apply_team_change(value['B'])
-                case 'gametime':
-                    if 'last_stop' in value:
-                        self.gametime_last_stop = value['last_stop']
-                    if 'last_start' in value:
-                        self.gametime_last_start = value['last_start']
-                    if 'running' in value:
-                        self.gametime_running = value['running']
-                case 'game_over':
-                    old_value = self.game_over
-                    self.game_over = value
-                    if old_value != value:
-                        self.emit_event('game_over', value)
-                case 'winner':
-                    self.winner = value
-                case 'in_overtime':
-                    self.in_overtime = value
-                case 'overtime_setscore':
-                    self.overtime_setscore = value
-                case 'forfeit':
-                    self.forfeit = value
-                case 'concede':
-                    self.concede = value
-                case 'score':
-                    if 'A' in value:
-                        self.teams['A'].apply_score_change(value['A'])
-                    if 'B' in value:
-                        self.teams['B'].apply_score_change(value['B'])
-                case 'events':
-                    self.apply_events_change(value)
+        start = time.perf_counter()
+        if modified:
+            for key, value in modified.items():
+                attribute = GAME_FIELDS.get(key)
+                if attribute:
+                    setattr(self, attribute, value)
+                else:
+                    handler = GAME_HANDLERS.get(key)
+                    if handler:
+                        handler(self, value)
         if added:
             self.apply_events_change(added['events'])
         if removed:
             self.apply_events_removed(removed['events'])
+        metrics.observe_stage('apply_change', start)
+        start = time.perf_counter()
         self.log_current_state()
+        metrics.observe_stage('log_state', start)
         self.emit_events()
 
+    def _apply_data_available(self, value):
+        old_value = self.data_available
+        self.data_available = value
+        if old_value != value:
+            self.emit_event('data_available', value)
+
+    def _apply_game_over(self, value):
+        old_value = self.game_over
+        self.game_over = value
+        if old_value != value:
+            self.emit_event('game_over', value)
+
+    def _apply_teams(self, value):
+        if 'A' in value:
+            self.teams['A'].apply_team_change(value['A'])
+        if 'B' in value:
+            self.teams['B'].apply_team_change(value['B'])
+
+    def _apply_gametime(self, value):
+        for key, attribute in GAMETIME_FIELDS:
+            if key in value:
+                setattr(self, attribute, value[key])
+
+    def _apply_score(self, value):
+        if 'A' in value:
+            self.teams['A'].apply_score_change(value['A'])
+        if 'B' in value:
+            self.teams['B'].apply_score_change(value['B'])
+
+    def validate_delta(self, modified, added, removed):
+        lengths = {}
+        for data in ((modified or {}).get('events'), (added or {}).get('events')):
+            for event_type, value in (data or {}).items():
+                length = self._event_count(lengths, event_type)
+                indices = range(len(value)) if isinstance(value, list) else value.keys()
+                for index in indices:
+                    index = _event_index(event_type, index)
+                    if index > length:
+                        raise IntegrityError(f"{self.public_id}: {event_type} event {index} added after {length} events")
+                    if index == length:
+                        length += 1
+                lengths[event_type] = length
+        for event_type, value in ((removed or {}).get('events') or {}).items():
+            length = self._event_count(lengths, event_type)
+            if isinstance(value, list):
+                length = 0
+            else:
+                for index in value.keys():
+                    index = _event_index(event_type, index)
+                    if index >= length:
+                        raise IntegrityError(f"{self.public_id}: removing {event_type} event {index} of {length}")
+                    length -= 1
+            lengths[event_type] = length
+
+    def _event_count(self, lengths, event_type):
+        if event_type not in self.events_by_type:
+            raise IntegrityError(f"{self.public_id}: unknown event type {event_type}")
+        return lengths.get(event_type, len(self.events_by_type[event_type]))
+
+    def check_invariants(self):
+        increments = self.events.increment_totals('score')
+        for letter, team in self.teams.items():
+            if increments.get(letter, 0) != team.quaffel_points_regular + team.quaffel_points_overtime:
+                return False
+        return True
+
     def apply_events_change(self, data):
         for event_type, value1 in data.items():
+            events = self.events_by_type[event_type]
             if isinstance(value1, list):
                 for index, value2 in enumerate(value1):
-                    self._apply_event_change(event_type, index, value2)
+                    self._apply_event_change(events, index, value2)
             else:
                 for index, value2 in value1.items():
-                    self._apply_event_change(event_type, int(index), value2)
+                    self._apply_event_change(events, int(index), value2)
 
-    def _apply_event_change(self, event_type, index, value):
-        if index >= len(self.__getattribute__(f"{event_type}_events")):
-            new_event = event_type_class(event_type)(value, self)
-            self.__getattribute__(f"{event_type}_events").append(new_event)
-            self.log_event(('add', new_event.event_type, str(index), *new_event.current_state()))
+    def _apply_event_change(self, events, index, value):
+        if index >= len(events):
+            event = events.append(value)
+            self.log_event(('add', event.event_type, str(index), *event.current_state()))
         else:
-            event = self.__getattribute__(f"{event_type}_events")[index]
+            event = events[index]
             event.apply_change(value)
             self.log_event(('mod', event.event_type, str(index), *event.current_state()))
 
     def apply_events_removed(self, data):
         for event_type, value1 in data.items():
+            events = self.events_by_type[event_type]
             if isinstance(value1, list):
-                for index, event in enumerate(self.__getattribute__(f"{event_type}_events")):
+                for index, event in enumerate(events):
                     self.log_event(('del', event.event_type, index, *event.current_state()))
-                self.__setattr__(f"{event_type}_events", [])
+                events.clear()
             else:
                 for index in value1.keys():
-                    event = self.__getattribute__(f"{event_type}_events").pop(int(index))
+                    event = events.pop(int(index))
                     self.log_event(('del', event.event_type, index, *event.current_state()))
 
-    def log_current_state(self):
-        current_state = [
-            datetime.datetime.now().isoformat(),
+    def current_state(self):
+        team_a = self.teams['A']
+        team_b = self.teams['B']
+        return (
             self.public_id,
             self.data_available,
             self.alive_timestamp,
@@ -136,46 +236,87 @@ class Game:
             self.winner,
             self.forfeit,
             self.concede,
-            self.teams['A'].name,
-            self.teams['A'].id,
-            self.teams['A'].quaffel_points_regular,
-            self.teams['A'].quaffel_points_overtime,
-            self.teams['A'].quaffel_points_concede,
-            self.teams['A'].snitch_caught,
-            self.teams['A'].snitch_points,
-            self.teams['A'].points_total,
-            self.teams['B'].name,
-            self.teams['B'].id,
-            self.teams['B'].quaffel_points_regular,
-            self.teams['B'].quaffel_points_overtime,
-            self.teams['B'].quaffel_points_concede,
-            self.teams['B'].snitch_caught,
-            self.teams['B'].snitch_points,
-            self.teams['B'].points_total,
-        ]
-        line = ','.join(str(x).replace(',', '') for x in current_state) + '\n'
-        file_name = f'game_logs/{self.public_id}.csv'
-        if path.exists(file_name):
-            with open(file_name, 'a') as f:
-                f.write(line)
+            team_a.name,
+            team_a.id,
+            team_a.quaffel_points_regular,
+            team_a.quaffel_points_overtime,
+            team_a.quaffel_points_concede,
+            team_a.snitch_caught,
+            team_a.snitch_points,
+            team_a.points_total,
+            team_b.name,
+            team_b.id,
+            team_b.quaffel_points_regular,
+            team_b.quaffel_points_overtime,
+            team_b.quaffel_points_concede,
+            team_b.snitch_caught,
+            team_b.snitch_points,
+            team_b.points_total,
+        )
+
+    def restore_state(self, state):
+        for (team, attribute), value in zip(STATE_FIELDS, state):
+            if team:
+                setattr(self.teams[team], attribute, value)
+            else:
+                setattr(self, attribute, value)
+        for team in self.teams.values():
+            team.calculate_score_str()
+
+    def snapshot(self):
+        return {
+            'state': self.current_state(),
+            'teams': {letter: tuple(getattr(team, field) for field in TEAM_DETAIL_FIELDS)
+                      for letter, team in self.teams.items()},
+            'events': self.events.__getstate__(),
+        }
+
+    def restore(self, snapshot):
+        self.restore_state(snapshot['state'])
+        for letter, details in snapshot['teams'].items():
+            for field, value in zip(TEAM_DETAIL_FIELDS, details):
+                setattr(self.teams[letter], field, value)
+        self.events.__setstate__(snapshot['events'])
+
+    def apply_complete(self, data):
+        # A complete payload lists every event, so anything beyond that (e.g. restored from an old checkpoint) is gone
+        for event_type, value in (data.get('events') or {}).items():
+            if isinstance(value, list):
+                events = self.events_by_type[event_type]
+                while len(events) > len(value):
+                    index = len(events) - 1
+                    event = events.pop(index)
+                    self.log_event(('del', event.event_type, index, *event.current_state()))
+        self.apply_change(data, None, None)
+
+    def log_current_state(self):
+        state = self.current_state()
+        now = time.time()
+
+        if STATE_LOG_CSV:
+            line = ','.join(str(x).replace(',', '') for x in (
+                datetime.datetime.fromtimestamp(now).isoformat(), *state)) + '\n'
+            self.watcher.log_writer.write(f'{self.public_id}.csv', STATE_LOG_HEADER, line)
+
+        last_state = self.journal_state
+        if last_state is None or self.journal_records_since_keyframe >= JOURNAL_KEYFRAME_INTERVAL:
+            record = ['k', now, state]
+            self.journal_records_since_keyframe = 0
         else:
-            with open(file_name, 'w') as f:
-                f.write("Time,PublicId,DataAvailable,AliveTimestamp,Cancelled,Suspended,GT Last Stop,GT Last Start,"
-                        "GT Running,in overtime,OT Set Score,GameOver,Winner,Forfeit,Concede,"
-                        "NameA,IdA,QP Regular A,QP OT A,QP Concede A,SnitchCaughtA,SnitchPointsA,PointsTotalA,"
-                        "NameB,IdB,QP Regular B,QP OT B,QP Concede B,SnitchCaughtB,SnitchPointsB,PointsTotalB\n")
-                f.write(line)
+            record = ['d', now]
+            for index, value, old_value in zip(STATE_INDICES, state, last_state):
+                if value is not old_value and (value != old_value or type(value) is not type(old_value)):
+                    record += (index, value)
+            if len(record) == 2:
+                return
+            self.journal_records_since_keyframe += 1
+        self.journal_state = state
+        line = JOURNAL_ENCODER.encode(record) + '\n'
+        self.watcher.log_writer.write(f'{self.public_id}.journal', JOURNAL_HEADER, line)
 
     def log_event(self, data):
         line = ','.join((datetime.datetime.now().isoformat(), *map(str, data))) + '\n'
-        file_name = f'game_logs/{self.public_id}_events.csv'
-        if path.exists(file_name):
-            with open(file_name, 'a') as f:
-                f.write(line)
-        else:
-            with open(file_name, 'w') as f:
-                f.write("Time,What,Type,Index,Period,Gametime,Team,P-Number,P-Name,Increment,Color,Reason\n")
-                f.write(line)
+        self.watcher.log_writer.write(f'{self.public_id}_events.csv', EVENT_LOG_HEADER, line)
 
     def emit_event(self, *args):
         self.scheduled_events.append(args)
@@ -187,7 +328,28 @@ class Game:
         self.scheduled_events = []
 
 
+class IntegrityError(Exception):
+    pass
+
+
+def _event_index(event_type, index):
+    try:
+        index = int(index)
+    except (TypeError, ValueError):
+        raise IntegrityError(f"invalid {event_type} event index {index!r}")
+    if index < 0:
+        # Python would count these from the end of the list
+        raise IntegrityError(f"negative {event_type} event index {index}")
+    return index
+
+
 class Team:
+    __slots__ = (
+        'game', 'letter', 'name', 'shortname', 'logo', 'id', 'jersey', 'jersey_primary_color',
+        'jersey_secondary_color', 'jersey_text_color', 'quaffel_points_regular', 'quaffel_points_overtime',
+        'quaffel_points_concede', 'snitch_caught', 'snitch_points', 'points_total', 'score_str',
+    )
+
     def __init__(self, game: Game, letter: str):
         self.game = game
         self.letter = letter
@@ -210,45 +372,35 @@ class Team:
 
     def apply_team_change(self, data):
         for key, value in data.items():
-            match key:
-                case 'name':
-                    self.name = value
-                case 'shortname':
-                    self.shortname = value or ''
-                case 'logo':
-                    self.logo = value
-                case 'id':
-                    self.id = value
-                case 'jersey':
-                    self.jersey = value
-                case 'jersey_primary_color':
-                    self.jersey_primary_color = value
-                case 'jersey_secondary_color':
-                    self.jersey_secondary_color = value
-                case 'jersey_text_color':
-                    self.jersey_text_color = value
+            if key in TEAM_FIELDS:
+                setattr(self, key, value)
+            elif key == 'shortname':
+                self.shortname = value or ''
 
     def apply_score_change(self, data):
         for key, value in data.items():
-            match key:
-                case 'quaffel_points':
-                    if 'regular' in value:
-                        self.quaffel_points_regular = value['regular']
-                    if 'overtime' in value:
-                        self.quaffel_points_overtime = value['overtime']
-                    if 'concede' in value:
-                        self.quaffel_points_concede = value['concede']
-                case 'snitch_caught':
-                    self.snitch_caught = value
-                    self.emit_event('snitch_caught', value)
-                case 'snitch_points':
-                    self.snitch_points = value
-                case 'total':
-                    self.emit_event('score_changed', value)
-                    self.points_total = value
-            self.calculate_score_str()
+            handler = SCORE_HANDLERS.get(key)
+            if handler:
+                handler(self, value)
+        self.calculate_score_str()
         self.emit_event('score', self.score_str)
 
+    def _apply_quaffel_points(self, value):
+        for key, attribute in QUAFFEL_POINTS_FIELDS:
+            if key in value:
+                setattr(self, attribute, value[key])
+
+    def _apply_snitch_caught(self, value):
+        self.snitch_caught = value
+        self.emit_event('snitch_caught', value)
+
+    def _apply_snitch_points(self, value):
+        self.snitch_points = value
+
+    def _apply_total(self, value):
+        self.emit_event('score_changed', value)
+        self.points_total = value
+
     def calculate_score_str(self):
         self.score_str = str(self.points_total)
         if self.snitch_points:
@@ -259,78 +411,133 @@ class Team:
 
 
 class Event:
-    def __init__(self, data, game):
-        self.game = game
-
-        self.period = data.get('period', None)
-        self.gametime = data.get('gametime', None)
+    __slots__ = ('store', 'slot')
 
-        self.team = data.get('team', None)
-        self.player_number = data.get('player_number', None)
-        self.player_name = data.get('player_name', None)
+    def __init__(self, store, slot):
+        self.store = store
+        self.slot = slot
 
-        self.color = data.get('color', None)
-        self.increment = data.get('increment', None)
-        self.reason = data.get('reason', None)
+    period = property(lambda self: self.store.value('period', self.slot))
+    gametime = property(lambda self: self.store.value('gametime', self.slot))
+    team = property(lambda self: self.store.value('team', self.slot))
+    player_number = property(lambda self: self.store.value('player_number', self.slot))
+    player_name = property(lambda self: self.store.value('player_name', self.slot))
+    color = property(lambda self: self.store.value('color', self.slot))
+    increment = property(lambda self: self.store.value('increment', self.slot))
+    reason = property(lambda self: self.store.value('reason', self.slot))
 
     def apply_change(self, data):
-        for key, value in data.items():
-            match key:
-                case 'period':
-                    self.period = value
-                case 'team':
-                    self.team = value
-                case 'gametime':
-                    self.gametime = value
-                case 'player_number':
-                    self.player_number = value
-                case 'player_name':
-                    self.player_name = value
-                case 'increment':
-                    self.increment = value
-                case 'color':
-                    self.color = value
-                case 'reason':
-                    self.reason = value
+        self.store.modify(self.slot, data)
 
     def current_state(self):
-        return (str(x).replace(',', '') for x in (
-            self.period,
-            self.gametime,
-            self.team,
-            self.player_number,
-            self.player_name,
-            self.increment,
-            self.color,
-            self.reason
-        ))
+        value = self.store.value
+        slot = self.slot
+        return (str(value(column, slot)).replace(',', '') for column in EVENT_LOG_COLUMNS)
+
+
+class EventList:
+    __slots__ = ('store', 'event_type', 'event_class')
+
+    def __init__(self, store, event_type, event_class):
+        self.store = store
+        self.event_type = event_type
+        self.event_class = event_class
+
+    def __len__(self):
+        return len(self.store.order[self.event_type])
+
+    def __getitem__(self, index):
+        return self.event_class(self.store, self.store.order[self.event_type][index])
+
+    def __iter__(self):
+        store = self.store
+        event_class = self.event_class
+        return (event_class(store, slot) for slot in store.order[self.event_type])
+
+    def append(self, data):
+        return self.event_class(self.store, self.store.append(self.event_type, data))
+
+    def pop(self, index):
+        return self.event_class(self.store, self.store.remove(self.event_type, index))
+
+    def clear(self):
+        self.store.clear(self.event_type)
 
 
 class ScoreEvent(Event):
+    __slots__ = ()
     event_type = 'score'
 
 
 class TimeoutEvent(Event):
+    __slots__ = ()
     event_type = 'timeout'
 
 
 class SnitchEvent(ScoreEvent):
+    __slots__ = ()
     event_type = 'snitch'
 
 
 class SnitchUnderReviewEvent(ScoreEvent):
+    __slots__ = ()
     event_type = 'snitch_uner_review'
 
 
 class PenaltyEvent(Event):
+    __slots__ = ()
     event_type = 'penalty'
 
 
+GAME_FIELDS = {
+    'cancelled_reason': 'cancelled',
+    'suspended_reason': 'suspended',
+    'alive_timestamp': 'alive_timestamp',
+    'winner': 'winner',
+    'in_overtime': 'in_overtime',
+    'overtime_setscore': 'overtime_setscore',
+    'forfeit': 'forfeit',
+    'concede': 'concede',
+}
+GAME_HANDLERS = {
+    'data_available': Game._apply_data_available,
+    'teams': Game._apply_teams,
+    'gametime': Game._apply_gametime,
+    'game_over': Game._apply_game_over,
+    'score': Game._apply_score,
+    'events': Game.apply_events_change,
+}
+GAMETIME_FIELDS = (
+    ('last_stop', 'gametime_last_stop'),
+    ('last_start', 'gametime_last_start'),
+    ('running', 'gametime_running'),
+)
+TEAM_DETAIL_FIELDS = (
+    'shortname', 'logo', 'jersey', 'jersey_primary_color', 'jersey_secondary_color', 'jersey_text_color',
+)
+TEAM_FIELDS = frozenset((
+    'name', 'logo', 'id', 'jersey', 'jersey_primary_color', 'jersey_secondary_color', 'jersey_text_color',
+))
+SCORE_HANDLERS = {
+    'quaffel_points': Team._apply_quaffel_points,
+    'snitch_caught': Team._apply_snitch_caught,
+    'snitch_points': Team._apply_snitch_points,
+    'total': Team._apply_total,
+}
+QUAFFEL_POINTS_FIELDS = (
+    ('regular', 'quaffel_points_regular'),
+    ('overtime', 'quaffel_points_overtime'),
+    ('concede', 'quaffel_points_concede'),
+)
+EVENT_LOG_COLUMNS = ('period', 'gametime', 'team', 'player_number', 'player_name', 'increment', 'color', 'reason')
+EVENT_TYPE_CLASSES = {
+    'score': ScoreEvent,
+    'timeout': TimeoutEvent,
+    'snitch': SnitchEvent,
+    'snitch_under_review': SnitchUnderReviewEvent,
+    'penalty': PenaltyEvent,
+}
+
+
 def event_type_class(event_type):
-    return {
-        'score': ScoreEvent,
-        'timeout': TimeoutEvent,
-        'snitch': SnitchEvent,
-        'snitch_under_review': SnitchUnderReviewEvent,
-        'penalty': PenaltyEvent,
-    }[event_type]
+    return EVENT_TYPE_CLASSES[event_type]
@@ -0,0 +1,79 @@
+import argparse
+import datetime
+import json
+import sys
+
+import game
+
+
+class _OfflineWatcher:
+    log_writer = None
+
+    def emit(self, event_game, event):
+        pass
+
+
+def read_states(file_name):
+    state = None
+    with open(file_name) as f:
+        for line in f:
+            record = json.loads(line)
+            match record[0]:
+                case 'h':
+                    continue
+                case 'k':
+                    state = list(record[2])
+                case 'd':
+                    if state is None:
+                        raise ValueError(f"{file_name}: delta record before the first keyframe")
+                    changes = record[2:]
+                    for index in range(0, len(changes), 2):
+                        state[changes[index]] = changes[index + 1]
+            yield record[1], tuple(state)
+
+
+def to_csv(file_name, out):
+    out.write(game.STATE_LOG_HEADER)
+    for timestamp, state in read_states(file_name):
+        out.write(','.join(str(x).replace(',', '') for x in (
+            datetime.datetime.fromtimestamp(timestamp).isoformat(), *state)) + '\n')
+
+
+def game_at(file_name, at=None):
+    if isinstance(at, str):
+        at = datetime.datetime.fromisoformat(at)
+    if isinstance(at, datetime.datetime):
+        at = at.timestamp()
+
+    last_state = None
+    for timestamp, state in read_states(file_name):
+        if at is not None and timestamp > at:
+            break
+        last_state = state
+    if last_state is None:
+        return None
+
+    restored = game.Game(_OfflineWatcher(), last_state[0])
+    restored.restore_state(last_state)
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild game state logs from a compact state journal')
+    parser.add_argument('journal', help='game_logs/<public_id>.journal')
+    parser.add_argument('--at', help='print the game state at this ISO timestamp instead of the full CSV')
+    args = parser.parse_args()
+
+    if args.at:
+        restored = game_at(args.journal, args.at)
+        if restored is None:
+            print('No state recorded before', args.at)
+            return
+        for (team, attribute), value in zip(game.STATE_FIELDS, restored.current_state()):
+            print(f"{team and team + ' ' or ''}{attribute}: {value}")
+    else:
+        to_csv(args.journal, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+import metrics
+
+LOG_DIRECTORY = 'game_logs'
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 500
+FILE_BUFFER_SIZE = 64 * 1024
+
+_CLOSE = object()
+
+
+class LogWriter:
+    def __init__(self, directory=LOG_DIRECTORY, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.files = {}
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='LogWriter', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, file_name, header, line):
+        # Called on the socket.io receive thread, so this must never touch the filesystem
+        self.queue.put((file_name, header, line))
+
+    def close(self, timeout=10):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_CLOSE)
+        self.thread.join(timeout)
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        dirty = set()
+        pending_lines = 0
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _CLOSE:
+                self._flush(dirty)
+                for f in self.files.values():
+                    f.close()
+                self.files = {}
+                return
+
+            if item is not None:
+                file_name, header, line = item
+                try:
+                    f = self.files.get(file_name) or self._open(file_name, header)
+                    f.write(line)
+                    dirty.add(f)
+                    pending_lines += 1
+                    metrics.LOG_LINES.inc()
+                except OSError as e:
+                    print('Could not write game log:', e)
+
+            if dirty and (item is None or pending_lines >= self.batch_size or time.monotonic() >= next_flush):
+                self._flush(dirty)
+                pending_lines = 0
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval
+
+    def _open(self, file_name, header):
+        f = open(os.path.join(self.directory, file_name), 'a', buffering=FILE_BUFFER_SIZE)
+        if f.tell() == 0:
+            f.write(header)
+        self.files[file_name] = f
+        return f
+
+    def _flush(self, dirty):
+        start = time.perf_counter()
+        for f in dirty:
+            try:
+                f.flush()
+            except OSError as e:
+                print('Could not flush game log:', e)
+        dirty.clear()
+        metrics.observe_stage('log_flush', start)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import socketio
+
+import secrets
+
+RESYNC_TIMEOUT = 15
+RESYNC_COOLDOWN = 30
+
+
+class GameResyncer:
+    def __init__(self, watcher, timeout=RESYNC_TIMEOUT, cooldown=RESYNC_COOLDOWN):
+        self.watcher = watcher
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.in_progress = set()
+        self.last_resync = {}
+        self.lock = threading.Lock()
+
+    def request(self, public_id):
+        with self.lock:
+            if public_id in self.in_progress:
+                return False
+            if time.monotonic() - self.last_resync.get(public_id, -self.cooldown) < self.cooldown:
+                return False
+            self.in_progress.add(public_id)
+            self.last_resync[public_id] = time.monotonic()
+        threading.Thread(target=self._resync, args=(public_id,), name=f'Resync-{public_id}', daemon=True).start()
+        return True
+
+    def _resync(self, public_id):
+        # A separate connection that only subscribes to this game, so the main subscription stays untouched
+        import games_watcher
+        received = threading.Event()
+        sio = socketio.Client()
+
+        @sio.event
+        def connect():
+            sio.emit('auth', {'auth': secrets.QUADBALL_LIVE_AUTH, 'games': [public_id]})
+
+        @sio.event
+        def complete(data):
+            if data.get('public_id') != public_id or received.is_set():
+                return
+            self.watcher.apply_resync(public_id, data)
+            received.set()
+
+        try:
+            sio.connect(games_watcher.REMOTE_SERVER)
+            if received.wait(self.timeout):
+                games_watcher.log(f"Resynced game {public_id}")
+            else:
+                games_watcher.log(f"Resync of game {public_id} timed out")
+        except socketio.exceptions.ConnectionError as e:
+            games_watcher.log(f"Resync of game {public_id} failed:", e)
+        finally:
+            if sio.connected:
+                sio.disconnect()
+            with self.lock:
+                self.in_progress.discard(public_id)
@@ -1,29 +1,60 @@
+import os
+import threading
+import time
+
 import socketio
 import requests
+import checkpoint
 import game
+import game_log
+import game_resync
+import listener_registry
+import metrics
+import profiling
+import stream_recording
 import datetime
 import secrets
 
 REMOTE_SERVER = 'https://quadball.live/'
 LOG_SIO = 'log.txt'
+# Every payload in LOG_SIO as well, the post-incident trace when RECORD_STREAM is off. Only written to the file,
+# through the log writer, so the receive thread neither prints nor touches the filesystem for them
+LOG_PAYLOADS = True
+RECORD_STREAM = False
 
 
 class GamesWatcher:
-    def __init__(self):
-        sio = self.sio = socketio.Client(logger=True)
+    def __init__(self, log_directory=game_log.LOG_DIRECTORY, checkpoint_name=checkpoint.CHECKPOINT_FILE_NAME,
+                 resync=True):
         self._public_ids = []
         self.game_data = {}
-        self.event_listeners = {}
-        self._next_event_listener_id = 1
+        self.listeners = listener_registry.ListenerRegistry()
         self.tournament_id = None
+        self.log_writer = game_log.LogWriter(log_directory)
+        self.recorder = None
+        self.handlers = {
+            'complete': self.on_complete,
+            'all games at once': self.on_all_games_at_once,
+            'delta': self.on_delta,
+            'alive': self.on_alive,
+        }
+        self.state_lock = threading.RLock()
+        # Replays, benches and load tests run without one, so they never reach out to quadball.live
+        self.resyncer = game_resync.GameResyncer(self) if resync else None
+        self.unchecked_invariants = set()
+        self.changes = 0
+        self.checkpointer = None
+        if checkpoint_name:
+            self.checkpointer = checkpoint.Checkpointer(self, os.path.join(log_directory, checkpoint_name))
+        self.sio = self.create_client()
+
+    def create_client(self):
+        sio = socketio.Client(logger=True)
 
         @sio.event
         def connect():
             log('Connected, authenticating...')
-            payload = {'auth': secrets.QUADBALL_LIVE_AUTH, 'games': self.public_ids}
-            if self.tournament_id:
-                payload['all_games_at_once'] = True
-            sio.emit('auth', payload)
+            sio.emit('auth', self.auth_payload())
 
         @sio.event
         def connect_error(data):
@@ -35,35 +66,110 @@ class GamesWatcher:
 
         @sio.event
         def status(data):
-            if data['status'] == 'success':
-                log('Connected and receiving data!')
-            else:
-                log('Status: ', data)
+            log_status(data)
 
         @sio.event
         def complete(data):
-            if LOG_SIO:
-                log(data)
-            self.game_data[data['public_id']].apply_change(data, None, None)
+            self.handle('complete', data)
 
         @sio.on('all games at once')
         def all_games_at_once(data):
-            if LOG_SIO:
-                log(data)
-            for game_data in data['data']:
-                self.game_data[game_data['public_id']].apply_change(game_data, None, None)
+            self.handle('all games at once', data)
 
         @sio.event
         def delta(data):
-            if LOG_SIO:
-                log(data)
-            self.game_data[data['public_id']].apply_change(data['modified'], data['added'], data['removed'])
+            self.handle('delta', data)
 
         @sio.event
         def alive(data):
-            if LOG_SIO:
-                log(data)
-            self.game_data[data['public_id']].apply_change(data, None, None)
+            self.handle('alive', data)
+
+        return sio
+
+    def auth_payload(self):
+        payload = {'auth': secrets.QUADBALL_LIVE_AUTH, 'games': self.public_ids}
+        if self.tournament_id:
+            payload['all_games_at_once'] = True
+        return payload
+
+    def handle(self, event, data):
+        if self.recorder:
+            self.recorder.record(event, data)
+        self.dispatch(event, data)
+
+    def dispatch(self, event, data):
+        metrics.MESSAGES.inc(event)
+        if LOG_PAYLOADS:
+            write_log(data)
+        profiler = profiling.active
+        profile = profiler and profiler.enable('handler')
+        start = time.perf_counter()
+        try:
+            with self.state_lock:
+                self.handlers[event](data)
+                self.changes += 1
+        finally:
+            if profile:
+                profiler.disable(profile)
+        metrics.observe_dispatch(event, start)
+
+    def on_complete(self, data):
+        watched_game = self.watched_game(data['public_id'])
+        if watched_game:
+            watched_game.apply_complete(data)
+
+    def on_all_games_at_once(self, data):
+        for game_data in data['data']:
+            watched_game = self.watched_game(game_data['public_id'])
+            if watched_game:
+                watched_game.apply_complete(game_data)
+
+    def on_delta(self, data):
+        public_id = data['public_id']
+        watched_game = self.watched_game(public_id)
+        if not watched_game:
+            return
+        modified, added, removed = data['modified'], data['added'], data['removed']
+        try:
+            watched_game.validate_delta(modified, added, removed)
+        except game.IntegrityError as e:
+            log('Dropped invalid delta:', e)
+            if self.resyncer:
+                self.resyncer.request(public_id)
+            return
+        watched_game.apply_change(modified, added, removed)
+        if (added or removed or (modified and ('score' in modified or 'events' in modified))) \
+                and public_id not in self.unchecked_invariants and not watched_game.check_invariants():
+            log(f"Score totals of game {public_id} don't match its score events")
+            if self.resyncer:
+                self.resyncer.request(public_id)
+
+    def on_alive(self, data):
+        metrics.observe_alive(data.get('alive_timestamp'))
+        watched_game = self.watched_game(data['public_id'])
+        if watched_game:
+            watched_game.apply_change(data, None, None)
+
+    def watched_game(self, public_id):
+        watched_game = self.game_data.get(public_id)
+        if watched_game is None:
+            log('Received data for unknown game', public_id)
+        return watched_game
+
+    def apply_resync(self, public_id, data):
+        self.handle('complete', data)
+        self.resynced(public_id)
+
+    def resynced(self, public_id):
+        # If even the server's complete state breaks the invariant, the check doesn't hold for this game
+        with self.state_lock:
+            watched_game = self.game_data.get(public_id)
+            if watched_game and not watched_game.check_invariants():
+                self.unchecked_invariants.add(public_id)
+
+    def start_recording(self, file_name=None):
+        self.recorder = stream_recording.Recorder(self.log_writer, file_name)
+        self.recorder.record_public_ids(self.public_ids, self.tournament_id)
 
     @property
     def public_ids(self):
@@ -71,37 +177,101 @@ class GamesWatcher:
 
     @public_ids.setter
     def public_ids(self, new_public_ids):
-        self._public_ids = new_public_ids
-        self.game_data = {public_id: game.Game(self, public_id) for public_id in new_public_ids}
+        with self.state_lock:
+            self._public_ids = new_public_ids
+            self.game_data = {
+                public_id: self.game_data.get(public_id) or game.Game(self, public_id) for public_id in new_public_ids
+            }
+        if self.recorder:
+            self.recorder.record_public_ids(new_public_ids, self.tournament_id)
+        # The games list arrives after the UI is up, which then picks up games it has no events for yet
+        self.emit(None, ('public_ids',))
 
-    def listen(self, event, callback, *args):
-        if event not in self.event_listeners:
-            self.event_listeners[event] = {}
-        self.event_listeners[event][self._next_event_listener_id] = (callback, args)
+    def restore_checkpoint(self, tournament_id=None):
+        if not self.checkpointer:
+            return False
+        saved = checkpoint.load(self.checkpointer.file_name)
+        if not saved or str(saved['tournament_id']) != str(tournament_id):
+            return False
+        with self.state_lock:
+            self.tournament_id = tournament_id
+            if not self.public_ids:
+                self.public_ids = saved['public_ids']
+            for public_id, snapshot in saved['games'].items():
+                if public_id in self.game_data:
+                    self.game_data[public_id].restore(snapshot)
+        log(f"Restored {len(saved['games'])} games from the checkpoint")
+        return True
+
+    def listen(self, event, callback, *args, public_id=None, team=None):
+        return self.listeners.subscribe(event, callback, *args, public_id=public_id, team=team)
+
+    def unlisten(self, subscription):
+        self.listeners.unsubscribe(subscription)
 
     def emit(self, event_game, event):
-        callbacks = self.event_listeners.get(event[0], {})
-        for callback in callbacks.values():
-            func, args = callback
-            func(event, event_game, *args)
+        start = time.perf_counter()
+        self.listeners.emit(event_game, event)
+        metrics.observe_stage('emit', start)
 
     def connect_public_id(self, public_id):
-        self.public_ids = [public_id]
+        self.connect_public_ids([public_id])
+
+    def connect_public_ids(self, public_ids):
+        self.restore_checkpoint()
+        self.public_ids = list(public_ids)
+        self.start_background_tasks()
         self.sio.connect(REMOTE_SERVER)
 
     def connect_tournament_id(self, tournament_id):
+        self.restore_checkpoint(tournament_id)
         r = requests.get(
             f"{REMOTE_SERVER}administration/getAllTournamentPublicGameIdsAndTimes.php",
             json={'tournament': str(tournament_id)}
         )
-        self.public_ids = r.json()['public_game_ids']
         self.tournament_id = tournament_id
+        self.public_ids = r.json()['public_game_ids']
+        self.start_background_tasks()
         self.sio.connect(REMOTE_SERVER)
 
+    def start_background_tasks(self):
+        if RECORD_STREAM and not self.recorder:
+            self.start_recording()
+        if self.checkpointer:
+            self.checkpointer.start()
+
+    def close(self):
+        if self.sio.connected:
+            self.sio.disconnect()
+        if self.checkpointer:
+            self.checkpointer.close()
+        self.log_writer.close()
+
+
+def log_status(data):
+    if data['status'] == 'success':
+        log('Connected and receiving data!')
+    else:
+        log('Status: ', data)
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
 
 def log(*data):
     print(*data)
+    write_log(*data)
+
+
+def write_log(*data):
+    global _log_writer
+    if not LOG_SIO:
+        return
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                _log_writer = game_log.LogWriter(os.path.dirname(LOG_SIO) or '.')
     text = ' '.join(map(str, data))
-    if LOG_SIO:
-        with open(LOG_SIO, 'a') as logfile:
-            logfile.write(f"{datetime.datetime.now()}: {text}\n")
+    # Also called on the receive thread, so the file is written by the log writer's thread
+    _log_writer.write(os.path.basename(LOG_SIO), '', f"{datetime.datetime.now()}: {text}\n")
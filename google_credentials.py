@@ -1,37 +1,134 @@
-import os.path
+import datetime
+import os
+import threading
 
-import google.auth.exceptions
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+TOKEN_DIRECTORY = 'token'
+SCOPES = {
+    'dqb': ['https://www.googleapis.com/auth/spreadsheets'],
+    'betting_form': ['https://www.googleapis.com/auth/forms.body', 'https://www.googleapis.com/auth/drive.file'],
+    'script': ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/docs'],
+}
+# Tokens are refreshed in the background this long before they expire, well before google-auth itself would
+# consider them invalid and refresh inside a request
+REFRESH_MARGIN = 600
+REFRESH_CHECK_INTERVAL = 60
 
-_google_credentials = {}
-def get_google_credentials(token_id='dqb'):
-    token_file = f"token/{token_id}_token.json"
-    scopes = {
-        'dqb': ['https://www.googleapis.com/auth/spreadsheets'],
-        'betting_form': ['https://www.googleapis.com/auth/forms.body', 'https://www.googleapis.com/auth/drive.file'],
-        'script': ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/docs'],
-    }[token_id]
-    try:
-        credentials = _google_credentials.get(token_id)
-        if not credentials and os.path.exists(token_file):
-            credentials = Credentials.from_authorized_user_file(token_file, scopes)
-        if not credentials or not credentials.valid:
-            if credentials and credentials.refresh_token:
+
+def token_file(token_id):
+    return os.path.join(TOKEN_DIRECTORY, f"{token_id}_token.json")
+
+
+def seconds_until_expiry(credentials):
+    if not credentials.expiry:
+        return None
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (credentials.expiry - now).total_seconds()
+
+
+class CredentialManager:
+    def __init__(self):
+        self.credentials = {}
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        self.refresh_thread = None
+        self.stop_event = threading.Event()
+
+    def get(self, token_id='dqb'):
+        credentials = self.credentials.get(token_id)
+        if credentials and credentials.valid:
+            return credentials
+        with self.lock(token_id):
+            credentials = self.credentials.get(token_id)
+            # Only reached on first use, or when the background refresh could not keep the token valid
+            if not credentials or not credentials.valid:
+                credentials = self._load(token_id, credentials)
+                self.credentials[token_id] = credentials
+        self.start_refreshing()
+        return credentials
+
+    def lock(self, token_id):
+        lock = self.locks.get(token_id)
+        if lock is None:
+            with self.locks_lock:
+                lock = self.locks.setdefault(token_id, threading.Lock())
+        return lock
+
+    def start_refreshing(self):
+        if self.refresh_thread is None:
+            with self.locks_lock:
+                if self.refresh_thread is None:
+                    self.refresh_thread = threading.Thread(target=self._refresh_loop, name='CredentialRefresh',
+                                                           daemon=True)
+                    self.refresh_thread.start()
+
+    def refresh_expiring(self, margin=REFRESH_MARGIN):
+        import google.auth.exceptions
+        from google.auth.transport.requests import Request
+
+        for token_id, credentials in list(self.credentials.items()):
+            remaining = seconds_until_expiry(credentials)
+            if remaining is None or remaining > margin or not credentials.refresh_token:
+                continue
+            with self.lock(token_id):
+                if self.credentials.get(token_id) is not credentials:
+                    continue
+                try:
+                    # Refreshing in place keeps the object that google_services' cached clients hold
+                    credentials.refresh(Request())
+                    self._save(token_id, credentials)
+                except google.auth.exceptions.RefreshError as e:
+                    print(f'Could not refresh {token_id} token:', e)
+                except (google.auth.exceptions.TransportError, OSError) as e:
+                    print(f'Could not refresh {token_id} token, retrying later:', e)
+
+    def close(self):
+        self.stop_event.set()
+
+    def _refresh_loop(self):
+        while not self.stop_event.wait(REFRESH_CHECK_INTERVAL):
+            self.refresh_expiring()
+
+    def _load(self, token_id, credentials):
+        # google-auth and oauthlib take a noticeable part of the startup time to import, and are only needed once
+        # the first Google request is made
+        import google.auth.exceptions
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        scopes = SCOPES[token_id]
+        file_name = token_file(token_id)
+        if not credentials and os.path.exists(file_name):
+            credentials = Credentials.from_authorized_user_file(file_name, scopes)
+            if credentials.scopes != scopes:
+                credentials = None
+        if credentials and credentials.valid:
+            return credentials
+        if credentials and credentials.refresh_token:
+            try:
                 credentials.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file('token/credentials.json', scopes)
-                credentials = flow.run_local_server(port=0)
-            with open(token_file, 'w') as token:
-                token.write(credentials.to_json())
-        if credentials.scopes != scopes:
-            os.remove(token_file)
-            _google_credentials[token_id] = None
-            return get_google_credentials(token_id)
-        _google_credentials[token_id] = credentials
+            except google.auth.exceptions.RefreshError as e:
+                print(f'Could not refresh {token_id} token, authorizing again:', e)
+                credentials = None
+        if not credentials or not credentials.valid:
+            flow = InstalledAppFlow.from_client_secrets_file(os.path.join(TOKEN_DIRECTORY, 'credentials.json'),
+                                                             scopes)
+            credentials = flow.run_local_server(port=0)
+        self._save(token_id, credentials)
         return credentials
-    except google.auth.exceptions.RefreshError:
-        os.remove(token_file)
-        _google_credentials[token_id] = None
-        return get_google_credentials(token_id)
+
+    def _save(self, token_id, credentials):
+        file_name = token_file(token_id)
+        temporary_file = f"{file_name}.tmp"
+        with open(temporary_file, 'w') as token:
+            token.write(credentials.to_json())
+            token.flush()
+            os.fsync(token.fileno())
+        os.replace(temporary_file, file_name)
+
+
+_manager = CredentialManager()
+
+
+def get_google_credentials(token_id='dqb'):
+    return _manager.get(token_id)
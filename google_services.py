@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+
+import google_credentials
+
+HTTP_TIMEOUT = 30
+LOG_TIMINGS = True
+
+_discovery_documents = {}
+_discovery_lock = threading.Lock()
+# googleapiclient services and their httplib2 connections must not be shared between threads
+_local = threading.local()
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def discovery_document(name, version):
+    key = (name, version)
+    document = _discovery_documents.get(key)
+    if document is None:
+        with _discovery_lock:
+            document = _discovery_documents.get(key)
+            if document is None:
+                from googleapiclient import discovery_cache
+                static_document = discovery_cache.get_static_doc(name, version)
+                document = json.loads(static_document) if static_document else False
+                _discovery_documents[key] = document
+    return document
+
+
+def get_service(name, version, token_id='dqb'):
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+    credentials = google_credentials.get_google_credentials(token_id)
+    key = (name, version, token_id)
+    cached = services.get(key)
+    if cached and cached[0] is credentials:
+        return cached[1]
+
+    # googleapiclient is slow to import, so that only happens once the first service is built, off the UI thread
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.discovery import build, build_from_document
+
+    start = time.perf_counter()
+    http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    document = discovery_document(name, version)
+    if document:
+        service = build_from_document(document, http=http)
+    else:
+        service = build(name, version, http=http)
+    record_timing(f"build {name} {version}", time.perf_counter() - start)
+    services[key] = (credentials, service)
+    return service
+
+
+def execute(request, **kwargs):
+    start = time.perf_counter()
+    try:
+        return request.execute(**kwargs)
+    finally:
+        record_timing(request.methodId, time.perf_counter() - start)
+
+
+def record_timing(name, duration):
+    if LOG_TIMINGS:
+        print(f"{name} took {duration * 1000:.0f}ms")
+    with _timings_lock:
+        count, total, maximum = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (count + 1, total + duration, max(maximum, duration))
+
+
+def timings():
+    with _timings_lock:
+        return dict(_timings)
+
+
+def timing_report():
+    return '\n'.join(
+        f"{name}: {count} calls, {total / count * 1000:.0f}ms avg, {maximum * 1000:.0f}ms max"
+        for name, (count, total, maximum) in sorted(timings().items())
+    )
@@ -0,0 +1,188 @@
+import argparse
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import action_executor
+
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = 8766
+ACTION_WAIT = 120
+
+
+class HeadlessService:
+    def __init__(self, watcher, games_list, startup=None):
+        self.watcher = watcher
+        self.games_list = games_list
+        self.startup = startup
+        self.actions = action_executor.ActionExecutor()
+        self.server = None
+        self.stopped = threading.Event()
+
+    def games(self):
+        games = []
+        with self.watcher.state_lock:
+            for public_id, watcher_game in self.watcher.game_data.items():
+                if public_id not in self.games_list.games_by_public_id:
+                    continue
+                if watcher_game.game_over:
+                    if not self.games_list.needs_confirmation(public_id, watcher_game):
+                        continue
+                    status = 'completed'
+                elif watcher_game.data_available:
+                    status = 'running'
+                else:
+                    continue
+                games.append({
+                    'public_id': public_id,
+                    'status': status,
+                    'team_a': watcher_game.teams['A'].name,
+                    'team_b': watcher_game.teams['B'].name,
+                    'score': f"{watcher_game.teams['A'].score_str}:{watcher_game.teams['B'].score_str}",
+                })
+        return games
+
+    def status(self):
+        return {
+            'exports': self.games_list.exports.status(),
+            'running_actions': self.actions.running_names(),
+            'startup': self.startup.status() if self.startup else {},
+        }
+
+    def confirm(self, public_id):
+        watcher_game = self.watcher.game_data[public_id]
+        if not self.games_list.needs_confirmation(public_id, watcher_game):
+            raise ValueError(f"{public_id} is not waiting for confirmation")
+        self.games_list.confirm(public_id, watcher_game)
+        return 'confirmed'
+
+    def run_action(self, name, func, *args, **kwargs):
+        future = self.actions.submit(name, func, *args, **kwargs)
+        if future is None:
+            raise RuntimeError(f"{name} is already running")
+        return future.result(ACTION_WAIT)
+
+    def reset(self, public_id):
+        admin_game = self.games_list.games_by_public_id[public_id]
+        response = self.run_action(f'reset {public_id}', admin_game.reset_timekeeper)
+        return response.ok
+
+    def handle_command(self, command, body):
+        match command:
+            case ['games']:
+                return self.games()
+            case ['status']:
+                return self.status()
+            case ['confirm', public_id]:
+                return self.confirm(public_id)
+            case ['reset', public_id]:
+                return self.reset(public_id)
+            case ['import']:
+                self.run_action('import', self.games_list.load)
+                return 'imported'
+            case ['export', 'schedule']:
+                self.run_action('export_schedule', self.games_list.write_to_live_admin, True)
+                return 'exported'
+            case ['export', 'results']:
+                self.run_action('export_results', self.games_list.write_to_google, True)
+                return 'exported'
+            case ['betting-form']:
+                if not body.get('title'):
+                    raise ValueError('betting-form needs a title')
+                text = self.run_action('betting_form', self.games_list.create_betting_form, body['title'], True,
+                                       body.get('split_by'), retries=0)
+                self.games_list.update_all()
+                return text
+        raise LookupError('/'.join(command))
+
+    def start(self, host=CONTROL_HOST, port=CONTROL_PORT):
+        handler = type('ControlHandler', (_ControlHandler,), {'service': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='ControlServer', daemon=True).start()
+        print(f"Control API on http://{host}:{port}/")
+
+    def run(self, host=CONTROL_HOST, port=CONTROL_PORT):
+        self.start(host, port)
+        try:
+            self.stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.stopped.set()
+        if self.server:
+            self.server.shutdown()
+        self.actions.close(wait=False, cancel_futures=True)
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        self._handle(allowed=(['games'], ['status']))
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self, allowed=None):
+        command = [part for part in self.path.split('?')[0].split('/') if part]
+        if allowed is not None and command not in allowed:
+            self._respond(405, {'error': 'use POST for actions'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            self._respond(200, {'result': self.service.handle_command(command, body)})
+        except LookupError as e:
+            self._respond(404, {'error': f"unknown game or command {e}"})
+        except (ValueError, RuntimeError) as e:
+            self._respond(409, {'error': str(e)})
+        except Exception as e:
+            self._respond(500, {'error': repr(e)})
+
+    def _respond(self, status, data):
+        body = json.dumps(data, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def send_command(command, body=None, host=CONTROL_HOST, port=CONTROL_PORT):
+    method = 'GET' if command in (['games'], ['status']) else 'POST'
+    data = json.dumps(body or {}).encode() if method == 'POST' else None
+    request = urllib.request.Request(f"http://{host}:{port}/{'/'.join(command)}", data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=ACTION_WAIT + 10) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Control a timekeeper running with main.py --headless')
+    parser.add_argument('command', nargs='+',
+                        help='games | status | confirm ID | reset ID | import | export schedule | export results | '
+                             'betting-form TITLE [pitch|slot]')
+    parser.add_argument('--port', type=int, default=CONTROL_PORT)
+    args = parser.parse_args()
+
+    command, body = args.command, None
+    if command[0] == 'betting-form':
+        body = {'title': command[1], 'split_by': command[2] if len(command) > 2 else None}
+        command = ['betting-form']
+    print(json.dumps(send_command(command, body, port=args.port), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
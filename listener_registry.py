@@ -0,0 +1,75 @@
+import itertools
+import threading
+
+TEAM_EVENTS = frozenset(('score', 'score_changed', 'snitch_caught'))
+
+
+class Subscription:
+    __slots__ = ('registry', 'id', 'event', 'key')
+
+    def __init__(self, registry, subscription_id, event, key):
+        self.registry = registry
+        self.id = subscription_id
+        self.event = event
+        self.key = key
+
+    def unsubscribe(self):
+        self.registry.unsubscribe(self)
+
+
+class ListenerRegistry:
+    def __init__(self):
+        # event -> (public_id, team) -> subscription id -> (callback, args), where None in any position matches
+        # everything. Modifications replace the affected dicts instead of mutating them, so emit needs no lock.
+        self.listeners = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event, callback, *args, public_id=None, team=None):
+        key = (public_id, team)
+        with self._lock:
+            subscription_id = next(self._ids)
+            by_key = dict(self.listeners.get(event, {}))
+            callbacks = dict(by_key.get(key, {}))
+            callbacks[subscription_id] = (callback, args)
+            by_key[key] = callbacks
+            self.listeners[event] = by_key
+        return Subscription(self, subscription_id, event, key)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            by_key = dict(self.listeners.get(subscription.event, {}))
+            callbacks = dict(by_key.get(subscription.key, {}))
+            if callbacks.pop(subscription.id, None) is None:
+                return
+            if callbacks:
+                by_key[subscription.key] = callbacks
+            else:
+                del by_key[subscription.key]
+            if by_key:
+                self.listeners[subscription.event] = by_key
+            else:
+                del self.listeners[subscription.event]
+
+    def emit(self, event_game, event):
+        listeners = self.listeners
+        for by_key in (listeners.get(event[0]), listeners.get(None)):
+            if not by_key:
+                continue
+            public_id = event_game.public_id if event_game else None
+            team = event[1] if event[0] in TEAM_EVENTS else None
+            for key in _matching_keys(public_id, team):
+                callbacks = by_key.get(key)
+                if callbacks:
+                    for func, args in callbacks.values():
+                        func(event, event_game, *args)
+
+
+def _matching_keys(public_id, team):
+    yield None, None
+    if public_id is not None:
+        yield public_id, None
+    if team is not None:
+        yield None, team
+        if public_id is not None:
+            yield public_id, team
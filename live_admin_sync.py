@@ -0,0 +1,94 @@
+import hashlib
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import secrets
+
+ADMIN_URL = 'https://quadball.live/administration/syncModelTournamentAdmin.php'
+REQUEST_TIMEOUT = 30
+# syncModelTournamentAdmin.php replaces the whole tournament model, so changed games alone are only sent
+# when this is switched off
+FULL_PAYLOADS = True
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                new_session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+                new_session.mount('https://', adapter)
+                new_session.mount('http://', adapter)
+                _session = new_session
+    return _session
+
+
+def post(url, **kwargs):
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    return session().post(url, **kwargs)
+
+
+def encode(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+class LiveAdminSync:
+    def __init__(self, url=None, full_payloads=FULL_PAYLOADS):
+        self.url = url or ADMIN_URL
+        self.full_payloads = full_payloads
+        # secret_id -> hash of the to_live_admin() payload the server last accepted
+        self.hashes = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.request_time = 0.0
+
+    def sync(self, games, force=False):
+        with self.lock:
+            payloads = {game.secret_id: game.to_live_admin() for game in games}
+            encoded = {secret_id: encode(payload) for secret_id, payload in payloads.items()}
+            hashes = {secret_id: hashlib.sha1(data.encode()).digest() for secret_id, data in encoded.items()}
+            changed = [secret_id for secret_id, digest in hashes.items() if self.hashes.get(secret_id) != digest]
+            removed = self.hashes.keys() - hashes.keys()
+            full_size = sum(len(data) for data in encoded.values())
+
+            if not (force or changed or removed):
+                self.skipped += 1
+                self.bytes_saved += full_size
+                print(f"Live admin unchanged, sync skipped ({self.report()})")
+                return None
+
+            if self.full_payloads or force or removed:
+                data = payloads
+            else:
+                data = {secret_id: payloads[secret_id] for secret_id in changed}
+            body = encode({'code': secrets.QUADBALL_LIVE_AUTH, 'data': data})
+
+            start = time.perf_counter()
+            response = post(self.url, data=body, headers={'Content-Type': 'application/json'})
+            self.request_time += time.perf_counter() - start
+            self.requests += 1
+            self.bytes_sent += len(body)
+            self.bytes_saved += max(full_size - sum(len(encoded[secret_id]) for secret_id in data), 0)
+            if not response.ok:
+                print('Live admin sync failed:', response.status_code)
+                # Raised so the export scheduler and the actions retry and report it
+                response.raise_for_status()
+            self.hashes = hashes
+            print(f"Live admin synced {len(changed)} changed games ({self.report()})")
+            return response
+
+    def report(self):
+        average = self.request_time / self.requests if self.requests else 0.0
+        return (f"{self.requests} requests, {self.skipped} skipped, {self.bytes_sent} bytes sent, "
+                f"{self.bytes_saved} bytes saved, ~{average * self.skipped:.1f}s saved")
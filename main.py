@@ -1,15 +1,63 @@
+import argparse
+
 import games_watcher
+import metrics
+import profiling
 import timekeeper_admin
-import ui
 import secrets
+import startup
+import watcher_supervisor
+
+
+def start_watcher(startup_tasks):
+    if isinstance(secrets.QUADBALL_LIVE_TOURNAMENT_ID, (list, tuple)):
+        watcher = watcher_supervisor.WatcherSupervisor.for_tournaments(secrets.QUADBALL_LIVE_TOURNAMENT_ID)
+        watcher.start(wait=False)
+        startup_tasks.run('quadball.live', watcher.wait_ready)
+    else:
+        watcher = games_watcher.GamesWatcher()
+        startup_tasks.run('quadball.live', watcher.connect_tournament_id, secrets.QUADBALL_LIVE_TOURNAMENT_ID)
+    return watcher
 
 
-def start():
+def start(profile=False, profile_interval=profiling.DUMP_INTERVAL, headless=False):
+    metrics.start_server()
+    profiler = None
+    if profile:
+        profiler = profiling.Profiler(interval=profile_interval)
+        profiler.start()
+    # The schedule import and the quadball.live connection run next to each other and next to the Kivy import, and
+    # the window shows their progress instead of waiting for both
+    startup_tasks = startup.Startup()
     games_list = timekeeper_admin.GamesList()
-    watcher = games_watcher.GamesWatcher()
-    watcher.connect_tournament_id(secrets.QUADBALL_LIVE_TOURNAMENT_ID)
-    ui.TimekeeperApp(watcher=watcher, games_list=games_list).run()
+    startup_tasks.run('schedule', games_list.load)
+    watcher = start_watcher(startup_tasks)
+    if profiler:
+        profiler.watcher = watcher
+        profiler.games_list = games_list
+    try:
+        if headless:
+            import headless as headless_service
+            headless_service.HeadlessService(watcher, games_list, startup_tasks).run()
+        else:
+            # Kivy sets up its window and input stack on import, which the headless mode does without
+            import ui
+            ui.TimekeeperApp(watcher=watcher, games_list=games_list, profiler=profiler, startup=startup_tasks).run()
+    finally:
+        startup_tasks.close()
+        games_list.close()
+        watcher.close()
+        if profiler:
+            profiler.close()
 
 
 if __name__ == '__main__':
-    start()
+    parser = argparse.ArgumentParser(description='Timekeeper dashboard for quadball.live tournaments')
+    parser.add_argument('--profile', action='store_true',
+                        help='write CPU profiles and allocation snapshots to profiling.PROFILE_DIRECTORY')
+    parser.add_argument('--profile-interval', type=float, default=profiling.DUMP_INTERVAL,
+                        help='seconds between profiling dumps')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without the Kivy window and take commands through the headless control API')
+    args = parser.parse_args()
+    start(profile=args.profile, profile_interval=args.profile_interval, headless=args.headless)
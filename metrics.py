@@ -0,0 +1,215 @@
+import bisect
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9464
+TIME_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                2.5, 5.0, 10.0, math.inf)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+_registry = []
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def samples(self):
+        for labels, value in sorted(self.snapshot().items()):
+            yield self.name, self.label_names, labels, value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, description, label_names=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [bucket counts..., sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: list(counts) for labels, counts in self.values.items()}
+
+    def samples(self):
+        for labels, counts in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                yield f"{self.name}_bucket", self.label_names + ('le',), labels + (le,), cumulative
+            yield f"{self.name}_sum", self.label_names, labels, counts[-2]
+            yield f"{self.name}_count", self.label_names, labels, counts[-1]
+
+    def quantile(self, q, *labels):
+        # Upper bound of the bucket holding the quantile, which is as precise as the buckets allow
+        with self.lock:
+            counts = self.values.get(labels)
+            if not counts or not counts[-1]:
+                return None
+            target = q * counts[-1]
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+        return None
+
+
+MESSAGES = Counter('quadball_messages_total', 'socket.io payloads received, by event', ('event',))
+STAGE_SECONDS = Histogram('quadball_stage_seconds', 'Time spent per processing stage', ('stage',))
+DISPATCH_SECONDS = Histogram('quadball_dispatch_seconds', 'Time spent handling socket.io payloads, by event',
+                             ('event',))
+ALIVE_LAG_SECONDS = Histogram('quadball_alive_lag_seconds',
+                              "Local processing time minus the server's alive_timestamp", buckets=LAG_BUCKETS)
+ALIVE_LAG = Gauge('quadball_alive_lag_last_seconds', 'Lag of the most recent alive payload')
+LOG_LINES = Counter('quadball_log_lines_total', 'Lines written by the game log writer')
+UI_ROWS = Gauge('quadball_ui_rows', 'Rows shown in the main window', ('kind',))
+
+
+def observe_stage(stage, start):
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+
+def observe_dispatch(event, start):
+    DISPATCH_SECONDS.observe(time.perf_counter() - start, event)
+
+
+def observe_alive(alive_timestamp):
+    if not isinstance(alive_timestamp, (int, float)):
+        return
+    lag = time.time() - alive_timestamp
+    ALIVE_LAG_SECONDS.observe(lag)
+    ALIVE_LAG.set(lag)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, label_names, labels, value in metric.samples():
+            if label_names:
+                label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in zip(label_names, labels))
+                name = f"{name}{{{label_text}}}"
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RateTracker:
+    def __init__(self, counter):
+        self.counter = counter
+        self.last = counter.snapshot()
+        self.last_time = time.monotonic()
+
+    def rates(self):
+        now = time.monotonic()
+        current = self.counter.snapshot()
+        elapsed = max(now - self.last_time, 1e-9)
+        rates = {labels: (value - self.last.get(labels, 0)) / elapsed for labels, value in current.items()}
+        self.last, self.last_time = current, now
+        return rates
+
+
+def summary_text(rate_tracker):
+    lines = []
+    rates = rate_tracker.rates()
+    if rates:
+        lines.append('  '.join(f"{labels[0]}: {rate:.1f}/s" for labels, rate in sorted(rates.items())))
+    for labels in sorted(STAGE_SECONDS.snapshot()):
+        p50 = STAGE_SECONDS.quantile(0.5, *labels)
+        p95 = STAGE_SECONDS.quantile(0.95, *labels)
+        lines.append(f"{labels[0]}: p50 <{_format_seconds(p50)}  p95 <{_format_seconds(p95)}")
+    for labels in sorted(DISPATCH_SECONDS.snapshot()):
+        p50 = DISPATCH_SECONDS.quantile(0.5, *labels)
+        p95 = DISPATCH_SECONDS.quantile(0.95, *labels)
+        lines.append(f"dispatch {labels[0]}: p50 <{_format_seconds(p50)}  p95 <{_format_seconds(p95)}")
+    lag = ALIVE_LAG.snapshot().get(())
+    if lag is not None:
+        lines.append(f"alive lag: {lag:.2f}s (p95 <{_format_seconds(ALIVE_LAG_SECONDS.quantile(0.95))})")
+    return '\n'.join(lines)
+
+
+def _format_seconds(value):
+    if value is None:
+        return '-'
+    if value == math.inf:
+        return 'inf'
+    if value < 0.001:
+        return f"{value * 1e6:.0f}us"
+    if value < 1:
+        return f"{value * 1000:.1f}ms"
+    return f"{value:.1f}s"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print('Could not start the metrics endpoint:', e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+
+import engineio.base_server
+import socketio
+from aiohttp import web
+
+HOST = '127.0.0.1'
+PORT = 8765
+GAMES = 20
+DELTA_RATE = 1.0
+ALIVE_INTERVAL = 5
+GAME_LENGTH = 0
+EVENT_TYPES = ('score', 'timeout', 'snitch', 'snitch_under_review', 'penalty')
+# Relative weights of the generated deltas
+ACTIONS = (
+    ('score', 60),
+    ('penalty', 15),
+    ('gametime', 15),
+    ('timeout', 5),
+    ('correction', 5),
+)
+
+
+def _use_stdlib_secrets():
+    # This project's secrets.py shadows the standard library module engine.io generates its session ids with
+    if hasattr(engineio.base_server.secrets, 'token_bytes'):
+        return
+    spec = importlib.util.spec_from_file_location('_stdlib_secrets', os.path.join(os.path.dirname(os.__file__),
+                                                                                  'secrets.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    engineio.base_server.secrets = module
+
+
+def new_team(number):
+    return {
+        'id': number,
+        'name': f"Team {number}",
+        'shortname': f"T{number}",
+        'logo': 'default.svg',
+        'jersey': 'jersey_ffffff',
+        'jersey_primary_color': '#ffffff',
+        'jersey_secondary_color': '#000000',
+        'jersey_text_color': '#000000',
+    }
+
+
+def new_score():
+    return {'quaffel_points': {'regular': 0, 'overtime': 0, 'concede': 0}, 'snitch_caught': False,
+            'snitch_points': 0, 'total': 0}
+
+
+class MockGame:
+    def __init__(self, public_id, number):
+        self.public_id = public_id
+        self.number = number
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.state = {
+            'public_id': self.public_id,
+            'data_available': True,
+            'alive_timestamp': int(self.started),
+            'cancelled_reason': None,
+            'suspended_reason': None,
+            'gametime': {'last_stop': 0, 'last_start': None, 'running': False},
+            'in_overtime': False,
+            'overtime_setscore': None,
+            'game_over': False,
+            'winner': None,
+            'forfeit': None,
+            'concede': None,
+            'teams': {'A': new_team(2 * self.number + 1), 'B': new_team(2 * self.number + 2)},
+            'score': {'A': new_score(), 'B': new_score()},
+            'events': {event_type: [] for event_type in EVENT_TYPES},
+        }
+        self.event_count = 0
+
+    def complete(self):
+        return dict(self.state, sent_at=time.time())
+
+    def alive(self):
+        self.state['alive_timestamp'] = int(time.time())
+        return {'public_id': self.public_id, 'alive_timestamp': self.state['alive_timestamp'], 'sent_at': time.time()}
+
+    def gametime_ms(self):
+        return int((time.time() - self.started) * 1000)
+
+    def tick(self, rng, game_length=GAME_LENGTH):
+        if self.state['game_over']:
+            return None
+        action = rng.choices([name for name, _weight in ACTIONS], [weight for _name, weight in ACTIONS])[0]
+        modified, added, removed = getattr(self, f"_{action}")(rng)
+        self.event_count += 1
+        if game_length and self.event_count >= game_length:
+            modified.update(self._game_over())
+        modified['sent_at'] = time.time()
+        return {'public_id': self.public_id, 'modified': modified, 'added': added, 'removed': removed}
+
+    def _event(self, rng, team, **extra):
+        player = rng.randint(0, 99)
+        return {'period': 1, 'gametime': self.gametime_ms(), 'team': team, 'player_number': str(player),
+                'player_name': f"Player {player}", **extra}
+
+    def _add_event(self, event_type, event):
+        events = self.state['events'][event_type]
+        events.append(event)
+        return {'events': {event_type: {str(len(events) - 1): event}}}
+
+    def _score(self, rng, increment=10):
+        team = rng.choice('AB')
+        score = self.state['score'][team]
+        score['quaffel_points']['regular'] += increment
+        score['total'] += increment
+        modified = {'score': {team: {'quaffel_points': {'regular': score['quaffel_points']['regular']},
+                                     'total': score['total']}}}
+        return modified, self._add_event('score', self._event(rng, team, increment=increment)), None
+
+    def _penalty(self, rng):
+        event = self._event(rng, rng.choice('AB'), color=rng.choice(('blue', 'yellow', 'red')),
+                            reason='Delay of game')
+        return {}, self._add_event('penalty', event), None
+
+    def _timeout(self, rng):
+        return {}, self._add_event('timeout', self._event(rng, rng.choice('AB'))), None
+
+    def _gametime(self, _rng):
+        gametime = self.state['gametime']
+        if gametime['running']:
+            gametime['last_stop'] = self.gametime_ms()
+            gametime['running'] = False
+        else:
+            gametime['last_start'] = int(time.time() * 1000)
+            gametime['running'] = True
+        return {'gametime': dict(gametime)}, None, None
+
+    def _correction(self, rng):
+        # The scorekeeper takes back the last goal
+        events = self.state['events']['score']
+        if not events:
+            return self._score(rng)
+        event = events.pop()
+        score = self.state['score'][event['team']]
+        score['quaffel_points']['regular'] -= event['increment']
+        score['total'] -= event['increment']
+        modified = {'score': {event['team']: {'quaffel_points': {'regular': score['quaffel_points']['regular']},
+                                              'total': score['total']}}}
+        return modified, None, {'events': {'score': {str(len(events)): None}}}
+
+    def _game_over(self):
+        score = self.state['score']
+        winner = 'A' if score['A']['total'] >= score['B']['total'] else 'B'
+        self.state.update(game_over=True, winner=winner)
+        self.state['gametime']['running'] = False
+        return {'game_over': True, 'winner': winner, 'gametime': dict(self.state['gametime'])}
+
+
+class MockServer:
+    def __init__(self, games=GAMES, delta_rate=DELTA_RATE, alive_interval=ALIVE_INTERVAL, game_length=GAME_LENGTH,
+                 tournament_id='1', auth=None, seed=None):
+        self.games = {f"mock{number:04d}": MockGame(f"mock{number:04d}", number) for number in range(games)}
+        self.delta_rate = delta_rate
+        self.alive_interval = alive_interval
+        self.game_length = game_length
+        self.tournament_id = str(tournament_id)
+        self.auth = auth
+        self.rng = random.Random(seed)
+        self.admin_syncs = []
+        self.resets = []
+        self.sent = 0
+        self.emit_lock = asyncio.Lock()
+
+        _use_stdlib_secrets()
+        self.sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+        self.sio.on('auth', self.on_auth)
+        self.app = web.Application()
+        self.sio.attach(self.app)
+        self.app.router.add_route('*', '/administration/getAllTournamentPublicGameIdsAndTimes.php', self.public_ids)
+        self.app.router.add_post('/administration/syncModelTournamentAdmin.php', self.sync_admin)
+        self.app.router.add_post('/tournamentadmin.php', self.reset_game)
+        self.runner = None
+        self.tasks = []
+
+    async def on_auth(self, sid, data):
+        if self.auth and data.get('auth') != self.auth:
+            await self.sio.emit('status', {'status': 'error', 'message': 'invalid auth'}, to=sid)
+            return
+        games = [self.games[public_id] for public_id in data.get('games') or [] if public_id in self.games]
+        # No delta may be sent between joining a game's room and its complete state
+        async with self.emit_lock:
+            for mock_game in games:
+                self.sio.enter_room(sid, mock_game.public_id)
+            await self.sio.emit('status', {'status': 'success'}, to=sid)
+            if data.get('all_games_at_once'):
+                await self.sio.emit('all games at once', {'data': [mock_game.complete() for mock_game in games]},
+                                    to=sid)
+            else:
+                for mock_game in games:
+                    await self.sio.emit('complete', mock_game.complete(), to=sid)
+
+    async def public_ids(self, request):
+        return web.json_response({'public_game_ids': list(self.games)})
+
+    async def sync_admin(self, request):
+        body = await request.json()
+        if self.auth and body.get('code') != self.auth:
+            return web.json_response({'status': 'error'}, status=403)
+        self.admin_syncs.append((time.time(), len(await request.read()), body.get('data')))
+        return web.json_response({'status': 'success'})
+
+    async def reset_game(self, request):
+        form = await request.post()
+        game_id = request.query.get('id') or form.get('id')
+        self.resets.append((time.time(), game_id))
+        # The real form takes the secret id; the mock also accepts public ids so resets can be tried end to end
+        mock_game = self.games.get(game_id)
+        if mock_game:
+            async with self.emit_lock:
+                mock_game.reset()
+                await self.sio.emit('complete', mock_game.complete(), room=mock_game.public_id)
+        return web.Response(text='ok')
+
+    async def generate_deltas(self):
+        games = list(self.games.values())
+        total_rate = self.delta_rate * len(games)
+        if not total_rate:
+            return
+        next_send = time.monotonic()
+        while True:
+            # Poisson arrivals over all games, scheduled against the clock so slow emits don't lower the rate
+            next_send += self.rng.expovariate(total_rate)
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            mock_game = self.rng.choice(games)
+            async with self.emit_lock:
+                delta = mock_game.tick(self.rng, self.game_length)
+                if delta:
+                    await self.sio.emit('delta', delta, room=mock_game.public_id)
+                    self.sent += 1
+
+    async def send_alive(self):
+        while True:
+            await asyncio.sleep(self.alive_interval)
+            for mock_game in self.games.values():
+                await self.sio.emit('alive', mock_game.alive(), room=mock_game.public_id)
+
+    async def start(self, host=HOST, port=PORT):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.tasks = [asyncio.create_task(self.generate_deltas()), asyncio.create_task(self.send_alive())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+
+def start_in_thread(server, host=HOST, port=PORT):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start(host, port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name='MockServer', daemon=True).start()
+    started.wait()
+    return loop
+
+
+def use_mock_server(url):
+    import games_watcher
+    import live_admin_sync
+    import timekeeper_admin
+    games_watcher.REMOTE_SERVER = url
+    live_admin_sync.ADMIN_URL = f"{url}administration/syncModelTournamentAdmin.php"
+    timekeeper_admin.RESET_URL = f"{url}tournamentadmin.php?section=modifygame&id="
+
+
+def lag_probe(watcher_class):
+    class LagProbe(watcher_class):
+        def __init__(self, *args, **kwargs):
+            self.lags = []
+            self.lags_lock = threading.Lock()
+            super().__init__(*args, **kwargs)
+
+        def dispatch(self, event, data):
+            super().dispatch(event, data)
+            if event == 'delta':
+                sent_at = (data.get('modified') or {}).get('sent_at')
+            elif event == 'all games at once':
+                sent_at = min((game_data.get('sent_at', 0) for game_data in data['data']), default=None)
+            else:
+                sent_at = data.get('sent_at')
+            if sent_at:
+                with self.lags_lock:
+                    self.lags.append((time.time(), time.time() - sent_at))
+
+        def take_lags(self):
+            with self.lags_lock:
+                lags, self.lags = self.lags, []
+            return lags
+
+    return LagProbe
+
+
+def run_load_test(games, delta_rate, duration, client='sync', interval=5, host=HOST, port=PORT, seed=None):
+    import games_watcher
+    games_watcher.LOG_SIO = None
+    server = MockServer(games=games, delta_rate=delta_rate, seed=seed)
+    loop = start_in_thread(server, host, port)
+    use_mock_server(f"http://{host}:{port}/")
+
+    if client == 'async':
+        import async_games_watcher
+        watcher = lag_probe(async_games_watcher.AsyncGamesWatcher)(log_directory='loadtest_logs', checkpoint_name=None,
+                                                                    resync=False)
+        watcher.start_tournament_id(server.tournament_id)
+    else:
+        watcher = lag_probe(games_watcher.GamesWatcher)(log_directory='loadtest_logs', checkpoint_name=None,
+                                                         resync=False)
+        threading.Thread(target=watcher.connect_tournament_id, args=(server.tournament_id,), daemon=True).start()
+    logging.getLogger('socketio.client').setLevel(logging.WARNING)
+    logging.getLogger('engineio.client').setLevel(logging.WARNING)
+
+    print(f"{games} games at {delta_rate} deltas/s each ({games * delta_rate:.0f} deltas/s), {client} client")
+    windows = []
+    start = time.monotonic()
+    sent_before = 0
+    try:
+        while time.monotonic() - start < duration:
+            time.sleep(interval)
+            lags = [lag for _received, lag in watcher.take_lags()]
+            sent, sent_before = server.sent - sent_before, server.sent
+            if not lags:
+                print(f"{time.monotonic() - start:5.0f}s  sent {sent / interval:7.1f}/s  nothing received")
+                continue
+            lags.sort()
+            window = {
+                'received': len(lags) / interval,
+                'p50': lags[len(lags) // 2],
+                'p95': lags[int(len(lags) * 0.95)],
+                'max': lags[-1],
+            }
+            windows.append(window)
+            print(f"{time.monotonic() - start:5.0f}s  sent {sent / interval:7.1f}/s  "
+                  f"applied {window['received']:7.1f}/s  lag p50 {window['p50'] * 1000:6.1f}ms  "
+                  f"p95 {window['p95'] * 1000:6.1f}ms  max {window['max'] * 1000:6.1f}ms")
+    finally:
+        watcher.close()
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+
+    if len(windows) >= 2:
+        # A client that keeps up has a flat lag; one that falls behind queues more every window
+        first, last = windows[0]['p50'], windows[-1]['p50']
+        falling_behind = last > max(first * 3, 0.5)
+        print(f"Median lag went from {first * 1000:.1f}ms to {last * 1000:.1f}ms: "
+              f"{'falling behind' if falling_behind else 'keeping up'}")
+    return windows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the quadball.live server and its PHP endpoints')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--games', type=int, default=GAMES)
+    parser.add_argument('--rate', type=float, default=DELTA_RATE, help='deltas per second and game')
+    parser.add_argument('--alive-interval', type=float, default=ALIVE_INTERVAL)
+    parser.add_argument('--game-length', type=int, default=GAME_LENGTH,
+                        help='deltas until a game is over, 0 for games that never end')
+    parser.add_argument('--auth', help='only accept this auth code')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--load-test', type=float, metavar='SECONDS',
+                        help='connect a GamesWatcher to the mock and report how far it lags behind')
+    parser.add_argument('--client', choices=('sync', 'async'), default='sync')
+    args = parser.parse_args()
+
+    if args.load_test:
+        run_load_test(args.games, args.rate, args.load_test, args.client, host=args.host, port=args.port,
+                      seed=args.seed)
+        return
+
+    server = MockServer(games=args.games, delta_rate=args.rate, alive_interval=args.alive_interval,
+                        game_length=args.game_length, auth=args.auth, seed=args.seed)
+
+    async def serve():
+        await server.start(args.host, args.port)
+        print(f"Serving {args.games} games on http://{args.host}:{args.port}/ "
+              f"(set games_watcher.REMOTE_SERVER to use it), tournament id {server.tournament_id}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
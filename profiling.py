@@ -0,0 +1,207 @@
+import argparse
+import cProfile
+import datetime
+import glob
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_DIRECTORY = 'profiles'
+DUMP_INTERVAL = 300
+# Profile one in this many handler calls, so the profiler's own overhead stays small on busy days; the dumped
+# call counts and times cover only the sampled calls
+SAMPLE_EVERY = 10
+TRACEMALLOC_FRAMES = 1
+# Allocations of the watcher games and the schedule are what grows over a tournament day
+TRACKED_FILES = ('game.py', 'event_store.py', 'timekeeper_admin.py', 'games_watcher.py')
+REPORT_LIMIT = 15
+# Before 3.12, cProfile hooks only the thread that enabled it, so handlers get one profile per thread. From 3.12 on it
+# uses sys.monitoring, which sees every thread but allows a single active profiler, so one profile covers the process
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+# The running Profiler, if profiling is enabled; checked on every handler call
+active = None
+
+
+class Profiler:
+    def __init__(self, directory=PROFILE_DIRECTORY, interval=DUMP_INTERVAL, sample_every=SAMPLE_EVERY):
+        self.directory = directory
+        self.interval = interval
+        self.sample_every = sample_every
+        self.watcher = None
+        self.games_list = None
+        # (name, thread id) -> Profile, and the keys of those enabled right now
+        self.sections = {}
+        self.enabled = set()
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.main_loop_profile = None
+        self.process_profile = None
+
+    def start(self, watcher=None, games_list=None):
+        global active
+        self.watcher = watcher
+        self.games_list = games_list
+        os.makedirs(self.directory, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if not PER_THREAD_PROFILES:
+            # Raises if a debugger or another profiler already holds sys.monitoring
+            self.process_profile = cProfile.Profile()
+            self.process_profile.enable()
+        active = self
+        self.thread = threading.Thread(target=self._run, name='Profiler', daemon=True)
+        self.thread.start()
+        print(f"Profiling into {self.directory}/ every {self.interval}s")
+
+    def enable(self, name):
+        if not PER_THREAD_PROFILES:
+            return None
+        key = (name, threading.get_ident())
+        with self.lock:
+            self.calls += 1
+            if self.calls % self.sample_every or key in self.enabled:
+                return None
+            profile = self.sections.get(key)
+            if profile is None:
+                profile = self.sections[key] = cProfile.Profile()
+            self.enabled.add(key)
+        profile.enable()
+        return key, profile
+
+    def disable(self, sample):
+        if sample is not None:
+            key, profile = sample
+            profile.disable()
+            with self.lock:
+                self.enabled.discard(key)
+
+    def start_main_loop(self, clock):
+        if not PER_THREAD_PROFILES:
+            # The process profile already covers the Kivy loop
+            return
+        # The hook set here only sees the Kivy thread, so it stays on and is rotated from the loop's own callbacks
+        self.main_loop_profile = cProfile.Profile()
+        self.main_loop_profile.enable()
+        clock.schedule_interval(lambda _dt: self._rotate_main_loop(), self.interval)
+
+    def _rotate_main_loop(self):
+        profile, self.main_loop_profile = self.main_loop_profile, cProfile.Profile()
+        profile.disable()
+        self.main_loop_profile.enable()
+        self._dump_profile([profile], 'main_loop', self._stamp())
+
+    def dump(self):
+        stamp = self._stamp()
+        with self.lock:
+            # Profiles in use by a handler right now are written with the next dump
+            sections = {key: profile for key, profile in self.sections.items() if key not in self.enabled}
+            self.sections = {key: profile for key, profile in self.sections.items() if key in self.enabled}
+        by_name = {}
+        for (name, _thread), profile in sections.items():
+            by_name.setdefault(name, []).append(profile)
+        for name, profiles in by_name.items():
+            self._dump_profile(profiles, name, stamp)
+        if self.process_profile:
+            profile, self.process_profile = self.process_profile, cProfile.Profile()
+            profile.disable()
+            self.process_profile.enable()
+            self._dump_profile([profile], 'process', stamp)
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(True, f"*{file_name}") for file_name in TRACKED_FILES])
+        snapshot.dump(os.path.join(self.directory, f"{stamp}_memory.snapshot"))
+        with open(os.path.join(self.directory, f"{stamp}_summary.json"), 'w') as f:
+            json.dump(self.summary(), f)
+
+    def summary(self):
+        current, peak = tracemalloc.get_traced_memory()
+        summary = {'time': time.time(), 'traced_memory': current, 'traced_peak': peak}
+        if self.watcher:
+            games = list(self.watcher.game_data.values())
+            summary['watcher_games'] = len(games)
+            summary['watcher_events'] = sum(len(watched_game.events) for watched_game in games)
+        if self.games_list:
+            summary['schedule_rows'] = len(self.games_list.all_games)
+            summary['schedule_games'] = len(self.games_list.games)
+        return summary
+
+    def close(self):
+        global active
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        if self.main_loop_profile:
+            self.main_loop_profile.disable()
+            self._dump_profile([self.main_loop_profile], 'main_loop', self._stamp())
+            self.main_loop_profile = None
+        active = None
+        self.dump()
+        if self.process_profile:
+            self.process_profile.disable()
+            self.process_profile = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                print('Could not write profile:', e)
+
+    def _dump_profile(self, profiles, name, stamp):
+        try:
+            stats = pstats.Stats(*profiles)
+        except TypeError:
+            # Nothing was profiled in this interval
+            return
+        stats.dump_stats(os.path.join(self.directory, f"{stamp}_{name}.prof"))
+
+    def _stamp(self):
+        return f"{datetime.datetime.now():%Y%m%d_%H%M%S}"
+
+
+def report(directory=PROFILE_DIRECTORY, limit=REPORT_LIMIT):
+    stamps = sorted({os.path.basename(path).split('_summary')[0]
+                     for path in glob.glob(os.path.join(directory, '*_summary.json'))})
+    previous = None
+    for stamp in stamps:
+        print(f"=== {stamp} ===")
+        with open(os.path.join(directory, f"{stamp}_summary.json")) as f:
+            summary = json.load(f)
+        if previous:
+            print('  '.join(f"{key}: {value} ({value - previous[0].get(key, 0):+})"
+                            for key, value in summary.items() if key != 'time'))
+        else:
+            print('  '.join(f"{key}: {value}" for key, value in summary.items() if key != 'time'))
+
+        for path in sorted(glob.glob(os.path.join(directory, f"{stamp}_*.prof"))):
+            print(f"--- {os.path.basename(path)}")
+            pstats.Stats(path).sort_stats('cumulative').print_stats(limit)
+
+        snapshot = tracemalloc.Snapshot.load(os.path.join(directory, f"{stamp}_memory.snapshot"))
+        if previous:
+            print(f"--- allocation growth since {previous[1]}")
+            for stat in snapshot.compare_to(previous[2], 'lineno')[:limit]:
+                print(stat)
+        else:
+            print('--- largest allocations')
+            for stat in snapshot.statistics('lineno')[:limit]:
+                print(stat)
+        previous = (summary, stamp, snapshot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare consecutive profiling dumps')
+    parser.add_argument('directory', nargs='?', default=PROFILE_DIRECTORY)
+    parser.add_argument('--limit', type=int, default=REPORT_LIMIT)
+    args = parser.parse_args()
+    report(args.directory, args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import metrics
+
+RETRY_DELAY = 15
+
+STARTUP_SECONDS = metrics.Gauge('quadball_startup_seconds', 'Seconds from process start until a startup task finished',
+                                ('task',))
+
+
+class StartupTask:
+    def __init__(self, name, func, args, retry_delay):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.retry_delay = retry_delay
+        self.thread = None
+        self.attempts = 0
+        self.finished = None
+        self.last_error = None
+
+    def status(self):
+        return {
+            'done': self.finished is not None,
+            'attempts': self.attempts,
+            'finished': self.finished,
+            'last_error': self.last_error,
+        }
+
+
+class Startup:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tasks = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def run(self, name, func, *args, retry_delay=RETRY_DELAY):
+        # Nothing works without the schedule and the connection, so failed tasks are retried until they succeed
+        # or the app closes
+        task = self.tasks[name] = StartupTask(name, func, args, retry_delay)
+        task.thread = threading.Thread(target=self._run, args=(task,), name=f'Startup-{name}', daemon=True)
+        task.thread.start()
+        return task
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+    def done(self):
+        return all(task.finished is not None for task in self.tasks.values())
+
+    def wait(self, timeout=None):
+        deadline = timeout and time.monotonic() + timeout
+        for task in list(self.tasks.values()):
+            task.thread.join(deadline and max(deadline - time.monotonic(), 0))
+        return self.done()
+
+    def status(self):
+        with self.lock:
+            return {name: task.status() for name, task in self.tasks.items()}
+
+    def status_text(self):
+        parts = []
+        for name, status in self.status().items():
+            if status['done']:
+                continue
+            if status['last_error']:
+                parts.append(f"{name}: failed {status['attempts']}x, retrying ({status['last_error']})")
+            else:
+                parts.append(f"{name}: loading...")
+        return ' | '.join(parts)
+
+    def close(self):
+        self.stop_event.set()
+
+    def _run(self, task):
+        while not self.stop_event.is_set():
+            with self.lock:
+                task.attempts += 1
+            try:
+                task.func(*task.args)
+            except Exception as e:
+                print(f'Startup task {task.name} failed, retrying in {task.retry_delay}s:', e)
+                with self.lock:
+                    task.last_error = str(e)
+                self._emit()
+                self.stop_event.wait(task.retry_delay)
+                continue
+            with self.lock:
+                task.finished = time.perf_counter() - self.started
+                task.last_error = None
+            STARTUP_SECONDS.set(task.finished, task.name)
+            print(f'{task.name} ready after {task.finished:.2f}s')
+            self._emit()
+            return
+
+    def _emit(self):
+        for callback in self.listeners:
+            callback(self)
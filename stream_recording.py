@@ -0,0 +1,90 @@
+import argparse
+import collections
+import datetime
+import json
+import time
+
+RECORDING_HEADER = '["h",1]\n'
+
+
+class Recorder:
+    def __init__(self, log_writer, file_name=None):
+        self.log_writer = log_writer
+        self.file_name = file_name or f"stream_{datetime.datetime.now():%Y%m%d_%H%M%S}.jsonl"
+
+    def record(self, event, data):
+        line = json.dumps([time.time(), event, data], separators=(',', ':')) + '\n'
+        self.log_writer.write(self.file_name, RECORDING_HEADER, line)
+
+    def record_public_ids(self, public_ids, tournament_id):
+        self.record('public_ids', {'public_ids': public_ids, 'tournament_id': tournament_id})
+
+
+def read_recording(file_name):
+    with open(file_name) as f:
+        for line in f:
+            record = json.loads(line)
+            if record[0] == 'h':
+                continue
+            yield record
+
+
+def replay(watcher, file_name, speed=1.0):
+    counts = collections.Counter()
+    handler_time = 0.0
+    first_timestamp = None
+    start = time.perf_counter()
+
+    for timestamp, event, data in read_recording(file_name):
+        if event == 'public_ids':
+            watcher.tournament_id = data['tournament_id']
+            watcher.public_ids = data['public_ids']
+            continue
+
+        if speed:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        handler_start = time.perf_counter()
+        watcher.handle(event, data)
+        handler_time += time.perf_counter() - handler_start
+        counts[event] += 1
+
+    return {
+        'messages': sum(counts.values()),
+        'by_event': dict(counts),
+        'wall_time': time.perf_counter() - start,
+        'handler_time': handler_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Feed a recorded socket.io stream back through GamesWatcher')
+    parser.add_argument('recording', help='game_logs/stream_<timestamp>.jsonl')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed factor, 0 for maximum speed')
+    parser.add_argument('--log-directory', default='replay_logs',
+                        help='where the replayed games write their logs, kept apart from game_logs')
+    args = parser.parse_args()
+
+    import games_watcher
+    games_watcher.LOG_SIO = None
+    watcher = games_watcher.GamesWatcher(log_directory=args.log_directory, checkpoint_name=None, resync=False)
+    try:
+        stats = replay(watcher, args.recording, args.speed)
+    finally:
+        watcher.close()
+
+    print(f"Replayed {stats['messages']} messages in {stats['wall_time']:.3f}s")
+    for event, count in sorted(stats['by_event'].items()):
+        print(f"  {event}: {count}")
+    if stats['messages']:
+        print(f"Handler time: {stats['handler_time']:.3f}s, "
+              f"{stats['handler_time'] / stats['messages'] * 1e6:.1f}us per message, "
+              f"{stats['messages'] / stats['handler_time']:.0f} messages/s")
+
+
+if __name__ == '__main__':
+    main()
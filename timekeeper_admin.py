@@ -1,16 +1,25 @@
 import random
+import threading
 from datetime import datetime, date, time
 from zoneinfo import ZoneInfo
-import requests
-import threading
-import google_credentials
+import betting_forms
+import export_scheduler
+import google_services
+import live_admin_sync
 import secrets
 
-from googleapiclient.discovery import build
-
 PRIVATE_SCHEDULE_DATA_RANGE = 'Tabellenblatt1!A2:M116'
 WRITE_DATA_RANGE = 'Tabellenblatt1!G2:M116'
-ADMIN_URL = 'https://quadball.live/administration/syncModelTournamentAdmin.php'
+WRITE_SHEET = 'Tabellenblatt1'
+WRITE_FIRST_COLUMN = 'G'
+WRITE_LAST_COLUMN = 'M'
+WRITE_FIRST_ROW = 2
+SHEETS_DEBOUNCE = 2
+SHEETS_MAX_LATENCY = 10
+REIMPORT_DEBOUNCE = 30
+REIMPORT_MAX_LATENCY = 120
+LIVE_ADMIN_DEBOUNCE = 1
+LIVE_ADMIN_MAX_LATENCY = 30
 RESET_URL = f'https://quadball.live/tournamentadmin.php?code={secrets.QUADBALL_LIVE_AUTH}&section=modifygame&id='
 
 
@@ -19,160 +28,230 @@ def new_random_secret_id():
     return ''.join(random.choices(options, k=6))
 
 
+def sheet_values(values, previous=None):
+    # The API skips None cells, so those keep whatever the sheet held before
+    previous = previous or ()
+    return tuple(
+        (previous[i] if i < len(previous) else '') if value is None else str(value)
+        for i, value in enumerate(values)
+    )
+
+
 class GamesList:
     def __init__(self):
         self.games = []
         self.all_games = []
         self.games_by_public_id = {}
         self.games_by_name = {}
+        self.imported_rows = []
+        # row index -> cell values (as strings) the spreadsheet holds in WRITE_DATA_RANGE
+        self.written_rows = {}
+        self.live_admin = live_admin_sync.LiveAdminSync()
+        # Set once the first import succeeded; load() runs in the background so the window can open meanwhile
+        self.loaded = threading.Event()
+        self.listeners = []
+        # Held while the games, the indexes or the written rows change
+        self.lock = threading.RLock()
+        # Results go to the sheet first; the re-import picks up edits made there and is only pushed to
+        # quadball.live afterwards
+        self.exports = export_scheduler.ExportScheduler()
+        self.exports.add_target('sheets', self.write_to_google, SHEETS_DEBOUNCE, SHEETS_MAX_LATENCY,
+                                then=('reimport',))
+        self.exports.add_target('reimport', self.import_all, REIMPORT_DEBOUNCE, REIMPORT_MAX_LATENCY,
+                                then=('live_admin',))
+        self.exports.add_target('live_admin', self.write_to_live_admin, LIVE_ADMIN_DEBOUNCE, LIVE_ADMIN_MAX_LATENCY)
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+    def emit_changed(self):
+        for callback in self.listeners:
+            callback(self)
+
+    def load(self):
         self.import_all()
-        self.update_timer = None
+        self.loaded.set()
+        self.emit_changed()
+
+    def require_loaded(self):
+        # Exporting before the first import would push an empty schedule
+        if not self.loaded.is_set():
+            raise RuntimeError('The schedule has not been imported yet')
 
     def update_all(self):
-        self.write_to_google()
-        update_timer = random.random()
-        self.update_timer = update_timer
-        threading.Timer(30, GamesList.update_all_timer, [self, update_timer]).start()
+        self.exports.schedule('sheets')
 
-    def update_all_timer(self, timer):
-        if self.update_timer != timer:
-            return
-        self.import_all()
-        self.write_to_live_admin()
+    def close(self):
+        # Confirmed results may still be waiting for their debounce window; the re-import is pointless when closing,
+        # but the live admin export behind it still runs
+        self.exports.close(skip=('reimport',))
+
+    def confirm(self, public_id, watcher_game):
+        with self.lock:
+            admin_game = self.games_by_public_id[public_id]
+            admin_game.team_a_points = watcher_game.teams['A'].points_total
+            admin_game.team_a_snitch = ['', '*'][watcher_game.teams['A'].snitch_caught]
+            admin_game.team_b_points = watcher_game.teams['B'].points_total
+            admin_game.team_b_snitch = ['', '*'][watcher_game.teams['B'].snitch_caught]
+        self.update_all()
+
+    def needs_confirmation(self, public_id, watcher_game):
+        admin_game = self.games_by_public_id.get(public_id)
+        # A confirmed 0 is a result too; only an empty cell means none was recorded
+        return watcher_game.game_over and admin_game is not None and admin_game.team_a_points in (None, '')
 
     def import_all(self):
-        service = build('sheets', 'v4', credentials=google_credentials.get_google_credentials())
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=secrets.PRIVATE_SCHEDULE, range=PRIVATE_SCHEDULE_DATA_RANGE).execute()
+        sheet = google_services.get_service('sheets', 'v4').spreadsheets()
+        result = google_services.execute(
+            sheet.values().get(spreadsheetId=secrets.PRIVATE_SCHEDULE, range=PRIVATE_SCHEDULE_DATA_RANGE))
         values = result.get('values', [])
 
         if not values:
             print('No data found.')
             raise
 
-        self.all_games = [
-            (len(row) > 3 and row[3] != 'no match')
-            and Game(row, index)
-            or NoGame(row, index)
-            for index, row in enumerate(values)
-        ]
-        self.games = [game for game in self.all_games if not isinstance(game, NoGame)]
-        self.games_by_public_id = {game.public_id: game for game in self.games}
-        self.games_by_name = {game.game_info['basic']: game for game in self.games if game.game_info['specification']}
+        # Manual imports, the scheduled re-import and the startup load can overlap; only the request runs unlocked
+        with self.lock:
+            # Unchanged rows keep their Game objects, so re-imports don't re-parse them or churn generated secret ids
+            imported_rows = [tuple(row) for row in values]
+            all_games = list(self.all_games[:len(values)])
+            # Rows the write-back hasn't reached yet have no ids in the sheet; they keep their generated secret id
+            # only when slot, pitch and game info still match, as rows may have been inserted or deleted above them
+            games_by_key = {}
+            for game in self.games:
+                key = game.schedule_key
+                games_by_key[key] = None if key in games_by_key else game
+            changed = []
+            for index, row in enumerate(values):
+                if index < len(self.imported_rows) and self.imported_rows[index] == imported_rows[index]:
+                    continue
+                old_game = all_games[index] if index < len(all_games) else None
+                if len(row) > 3 and row[3] != 'no match':
+                    public_id = len(row) > 10 and row[10] or None
+                    previous = self.games_by_public_id.get(public_id) if public_id else None
+                    previous = previous or games_by_key.get(schedule_key(row))
+                    game = Game(row, index, previous and previous.secret_id)
+                else:
+                    game = NoGame(row, index)
+                if old_game is None:
+                    all_games.append(game)
+                else:
+                    all_games[index] = game
+                changed.append((old_game, game))
+            removed = self.all_games[len(values):]
+            self.imported_rows = imported_rows
+            if not changed and not removed:
+                return
 
-    def write_to_live_admin(self):
-        body = {
-            "code": secrets.QUADBALL_LIVE_AUTH,
-            "data": {
-                game.secret_id: game.to_live_admin() for game in self.games
-            }
-        }
-        response = requests.post(ADMIN_URL, json=body)
-        return response
+            for old_game, _game in changed:
+                self._unindex(old_game)
+            for old_game in removed:
+                self._unindex(old_game)
+                self.written_rows.pop(old_game.index, None)
+            for _old_game, game in changed:
+                self.written_rows[game.index] = sheet_values((values[game.index] + [None] * 13)[6:13])
+                if not isinstance(game, NoGame):
+                    self.games_by_public_id[game.public_id] = game
+                    if game.game_info['specification']:
+                        self.games_by_name[game.game_info['basic']] = game
+            self.all_games = all_games
+            self.games = [game for game in all_games if not isinstance(game, NoGame)]
+        self.emit_changed()
+        print(f'Imported {len(changed)} changed and {len(removed)} removed schedule rows')
 
-    def write_to_google(self):
-        service = build('sheets', 'v4', credentials=google_credentials.get_google_credentials())
-        sheet = service.spreadsheets()
-        body = {
-            'range': WRITE_DATA_RANGE,
-            'majorDimension': 'ROWS',
-            'values': [
-                [
+    def _unindex(self, game):
+        if game is None or isinstance(game, NoGame):
+            return
+        if self.games_by_public_id.get(game.public_id) is game:
+            del self.games_by_public_id[game.public_id]
+        if self.games_by_name.get(game.game_info['basic']) is game:
+            del self.games_by_name[game.game_info['basic']]
+
+    def write_to_live_admin(self, force=False):
+        self.require_loaded()
+        with self.lock:
+            games = list(self.games)
+        return self.live_admin.sync(games, force=force)
+
+    def write_to_google(self, force=False):
+        self.require_loaded()
+        sheet = google_services.get_service('sheets', 'v4').spreadsheets()
+        with self.lock:
+            rows = [
+                (game.index, [
                     game.team_a_points_int, game.team_a_snitch, game.team_b_points_int,
                     game.team_b_snitch, game.public_id, game.secret_id, game.betting_form,
-                ] for game in self.all_games
+                ]) for game in self.all_games
             ]
-        }
-        sheet.values().update(
-            spreadsheetId=secrets.PRIVATE_SCHEDULE, range=WRITE_DATA_RANGE, valueInputOption='RAW', body=body).execute()
-
-    def create_betting_form(self, form_title, deadlines=False):
-        games_needing_form = [game for game in self.games if game.needs_betting_form()]
-        service = build('forms', 'v1', credentials=google_credentials.get_google_credentials('betting_form'))
-        new_form = {
-            'info': {
-                'title': f'Tippspiel DQP 2023 – {form_title}',
-                'document_title': form_title,
+            written_rows = dict(self.written_rows)
+        if force:
+            body = {
+                'range': WRITE_DATA_RANGE,
+                'majorDimension': 'ROWS',
+                'values': [values for index, values in rows]
             }
-        }
-        create_result = service.forms().create(body=new_form).execute()
-        form_id = create_result['formId']
-        service.forms().batchUpdate(formId=form_id, body = {
-            'requests': [
-                {
-                    'createItem': {
-                        'item': {
-                            'title': 'Name',
-                            'description': 'Damit wir deine Antworten auch über mehrere Formulare zuordnen können.',
-                            'questionItem': {
-                                'question': {
-                                    'required': True,
-                                    'textQuestion': {
-                                        'paragraph': False,
-                                    },
-                                },
-                            },
-                        },
-                        'location': { 'index': 0 },
-                    },
-                },
-                {
-                    'createItem': {
-                        'item': {
-                            'title': 'Team',
-                            'questionItem': {
-                                'question': {
-                                    'required': True,
-                                    'textQuestion': {
-                                        'paragraph': False,
-                                    },
-                                },
-                            },
-                        },
-                        'location': { 'index': 1 },
-                    },
-                },
-            ] + [
+            google_services.execute(sheet.values().update(
+                spreadsheetId=secrets.PRIVATE_SCHEDULE, range=WRITE_DATA_RANGE, valueInputOption='RAW', body=body))
+            with self.lock:
+                self.written_rows = {index: sheet_values(values) for index, values in rows}
+            return
+
+        changed = [
+            (index, values) for index, values in rows
+            if sheet_values(values, written_rows.get(index)) != written_rows.get(index)
+        ]
+        if not changed:
+            return
+        data = []
+        for index, values in changed:
+            if data and data[-1][1] == index - 1:
+                data[-1][1] = index
+                data[-1][2].append(values)
+            else:
+                data.append([index, index, [values]])
+        body = {
+            'valueInputOption': 'RAW',
+            'data': [
                 {
-                    'createItem': {
-                        'item': {
-                            'title': game.german_description,
-                            'description': deadlines and f"Deadline: {game.time:%H:%M}" or '',
-                            'questionItem': {
-                                'question': {
-                                    'required': True,
-                                    'choiceQuestion': {
-                                        'type': 'RADIO',
-                                        'options': [
-                                            { 'value': game.team_a["name"] },
-                                            { 'value': game.team_b["name"] },
-                                        ]
-                                    },
-                                },
-                            },
-                        },
-                        'location': { 'index': index + 2 },
-                    },
-                } for index, game in enumerate(games_needing_form)
+                    'range': f"{WRITE_SHEET}!{WRITE_FIRST_COLUMN}{first + WRITE_FIRST_ROW}"
+                             f":{WRITE_LAST_COLUMN}{last + WRITE_FIRST_ROW}",
+                    'majorDimension': 'ROWS',
+                    'values': values,
+                } for first, last, values in data
             ]
-        }).execute()
+        }
+        google_services.execute(sheet.values().batchUpdate(spreadsheetId=secrets.PRIVATE_SCHEDULE, body=body))
+        with self.lock:
+            for index, values in changed:
+                self.written_rows[index] = sheet_values(values, self.written_rows.get(index))
 
-        drive_service = build('drive', 'v3', credentials=google_credentials.get_google_credentials('betting_form'))
-        file = drive_service.files().get(fileId=form_id, fields='parents').execute()
-        file = drive_service.files().update(fileId=form_id, addParents=secrets.BETTING_FORM_FOLDER, removeParents=",".join(file.get('parents')),fields="id, parents").execute()
+    def create_betting_form(self, form_title, deadlines=False, split_by=None):
+        self.require_loaded()
+        with self.lock:
+            games_needing_form = [game for game in self.games if game.needs_betting_form()]
+        text, links = betting_forms.create_betting_forms(games_needing_form, form_title, deadlines, split_by)
+        # Creating the forms takes a while, and an import in between replaces the Game objects of changed rows
+        with self.lock:
+            for old_game, responder_uri in links:
+                game = self.current_game(old_game)
+                if game is not None:
+                    game.betting_form = responder_uri
+        return text
 
-        text_response_games = "\n".join(f"{game.team_a['name']} – {game.team_b['name']}{deadlines and f' (Deadline: {game.time:%H:%M})' or ''}" for game in games_needing_form)
-        text_response = f"""Es gibt ein neues Formular für die folgenden Spiele:
-{text_response_games}
+    def current_game(self, old_game):
+        if old_game.public_id:
+            return self.games_by_public_id.get(old_game.public_id)
+        matches = [game for game in self.games if game.schedule_key == old_game.schedule_key]
+        return matches[0] if len(matches) == 1 else None
 
-Jetzt tippen unter {create_result['responderUri']}"""
-        for game in games_needing_form:
-            game.betting_form = create_result['responderUri']
-        return text_response
+
+def schedule_key(row):
+    return tuple(row[1:4])
 
 
 class Game:
-    def __init__(self, row, index):
+    def __init__(self, row, index, secret_id=None):
+        self.schedule_key = schedule_key(row)
         row += [None] * 12
         self.changes_made = False
         self.index = index
@@ -200,7 +279,7 @@ class Game:
         self.secret_id = row[11]
         self.betting_form = row[12]
         if not self.secret_id:
-            self.secret_id = new_random_secret_id()
+            self.secret_id = secret_id or new_random_secret_id()
 
     @property
     def team_a_points_int(self):
@@ -215,7 +294,7 @@ class Game:
         return None
 
     def reset_timekeeper(self):
-        response = requests.post(RESET_URL + self.secret_id, data={'form': 'reset_prepared_game', 'id': self.secret_id})
+        return live_admin_sync.post(RESET_URL + self.secret_id, data={'form': 'reset_prepared_game', 'id': self.secret_id})
 
     @property
     def game_info(self):
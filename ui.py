@@ -1,102 +1,236 @@
+import threading
+import time
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
-from kivy.properties import ColorProperty, StringProperty, ObjectProperty
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.properties import BooleanProperty, ColorProperty, ListProperty, NumericProperty, StringProperty, ObjectProperty
 from kivy.clock import Clock
 
+import action_executor
+import metrics
+
+BETTING_SPLITS = {'Ein Formular': None, 'Pro Pitch': 'pitch', 'Pro Slot': 'slot'}
+
 
 class MainFrame(BoxLayout):
     completed_games = ObjectProperty(None)
     running_games = ObjectProperty(None)
+    completed_count = NumericProperty(0)
+    running_count = NumericProperty(0)
     requesting_reset = ObjectProperty(None, allownone=True)
     betting_modal = ObjectProperty(None)
     betting_text_input = ObjectProperty(None)
+    betting_split = ObjectProperty(None)
+    export_status = StringProperty('')
+    running_actions = ListProperty([])
+    show_metrics = BooleanProperty(False)
+    metrics_text = StringProperty('')
+    loading_status = StringProperty('')
 
     def __init__(self, **kwargs):
         self.watcher = kwargs.pop('watcher')
         self.games_list = kwargs.pop('games_list')
-        self.games = {}
+        self.startup = kwargs.pop('startup', None)
+        self.game_rows = {}
+        self.row_indices = {'completed': {}, 'running': {}}
         super().__init__(**kwargs)
-        for public_id, game_data in self.watcher.game_data.items():
-            self.insert_new_game(public_id, game_data)
+        self.row_views = {'completed': self.completed_games, 'running': self.running_games}
+        # Network calls triggered by buttons run on the pool; their callbacks come back through the Clock
+        self.actions = action_executor.ActionExecutor(dispatch=lambda func: Clock.schedule_once(lambda _dt: func()))
+        self.actions.listen(self.actions_changed)
+        self.refresh_rows(0)
+
+        # Watcher events arrive on the network thread and often in bursts, so they are only collected here and
+        # applied once per frame, keeping the latest value per game and field
+        self.dirty = {}
+        self.dirty_since = None
+        self.dirty_lock = threading.Lock()
+        self.apply_dirty_trigger = Clock.create_trigger(self.apply_dirty)
+        self.watcher.listen('score', self.mark_dirty)
+        self.watcher.listen('data_available', self.mark_dirty)
+        self.watcher.listen('game_over', self.mark_dirty)
+        # The window opens before the schedule and the games list are loaded; once either arrives, every row is
+        # checked again
+        self.refresh_rows_trigger = Clock.create_trigger(self.refresh_rows)
+        self.watcher.listen('public_ids', lambda _event, _game: self.refresh_rows_trigger())
+        self.games_list.listen(lambda _games_list: self.refresh_rows_trigger())
+
+        self.update_export_status_trigger = Clock.create_trigger(self.update_export_status)
+        self.games_list.exports.listen(lambda _scheduler: self.update_export_status_trigger())
+        if self.startup:
+            self.startup.listen(lambda _startup: self.update_export_status_trigger())
+        Clock.schedule_interval(self.update_export_status, 1)
+        self.metrics_rates = metrics.RateTracker(metrics.MESSAGES)
+        Clock.schedule_interval(self.update_metrics, 1)
+
+    def update_export_status(self, _dt):
+        self.export_status = self.games_list.exports.status_text()
+        self.loading_status = self.startup.status_text() if self.startup else ''
 
-        self.watcher.listen('score', lambda *args: Clock.schedule_once(lambda dt: self.score_changed(*args)))
-        self.watcher.listen('data_available', lambda *args: Clock.schedule_once(lambda dt: self.game_status_changed(*args)))
-        self.watcher.listen('game_over', lambda *args: Clock.schedule_once(lambda dt: self.game_status_changed(*args)))
+    def update_metrics(self, _dt):
+        if self.show_metrics:
+            self.metrics_text = metrics.summary_text(self.metrics_rates)
+
+    def toggle_metrics(self):
+        self.show_metrics = not self.show_metrics
+        self.update_metrics(0)
+
+    def actions_changed(self, actions):
+        self.running_actions = actions.running_names()
+
+    def mark_dirty(self, event, game):
+        if event[0] == 'score':
+            key = (game.public_id, f"score_{event[1]}")
+        else:
+            key = (game.public_id, 'status')
+        with self.dirty_lock:
+            self.dirty[key] = (event, game)
+            if self.dirty_since is None:
+                self.dirty_since = time.perf_counter()
+        self.apply_dirty_trigger()
+
+    def apply_dirty(self, _dt):
+        start = time.perf_counter()
+        with self.dirty_lock:
+            dirty, self.dirty = self.dirty, {}
+            dirty_since, self.dirty_since = self.dirty_since, None
+        if dirty_since is not None:
+            # How long a change waited for the next frame
+            metrics.STAGE_SECONDS.observe(start - dirty_since, 'ui_frame_delay')
+        rebuilt = set()
+        for (public_id, field), (event, game) in dirty.items():
+            if field == 'status':
+                self.game_status_changed(event, game)
+                rebuilt.add(public_id)
+        for (public_id, field), (event, game) in dirty.items():
+            if field != 'status' and public_id not in rebuilt:
+                self.score_changed(event, game)
+        metrics.observe_stage('ui_apply_dirty', start)
 
     def score_changed(self, event, game):
-        ui_game = self.games.get(game.public_id, None)
-        if ui_game:
+        if game.public_id in self.game_rows:
             if event[1] == 'A':
-                ui_game.team_a_score = event[2]
+                self.update_row(game.public_id, team_a_score=event[2])
             if event[1] == 'B':
-                ui_game.team_b_score = event[2]
+                self.update_row(game.public_id, team_b_score=event[2])
 
     def game_status_changed(self, _event, game):
         public_id = game.public_id
-        current_widget = self.games.pop(public_id, None)
-        if current_widget:
-            current_widget.parent.remove_widget(current_widget)
-        self.insert_new_game(game.public_id, game)
+        kind = self.row_kind(public_id, game)
+        current = self.game_rows.get(public_id)
+        if current and current[0] == kind:
+            self.update_row(public_id, **self.game_variables(game))
+        else:
+            self.remove_row(public_id)
+            if kind:
+                self.add_row(kind, public_id, game)
+
+    def refresh_rows(self, _dt):
+        with self.watcher.state_lock:
+            game_data = dict(self.watcher.game_data)
+        for public_id in list(self.game_rows):
+            if public_id not in game_data:
+                self.remove_row(public_id)
+        for game in game_data.values():
+            self.game_status_changed(None, game)
 
-    def insert_new_game(self, public_id, game_data):
+    def row_kind(self, public_id, game_data):
         if game_data.game_over:
-            if not self.games_list.games_by_public_id[public_id].team_a_points:
-                game = CompletedGame(public_id=public_id, mainframe=self)
-                self.assign_game_variables(game, public_id, game_data)
-                self.completed_games.add_widget(game)
+            if self.games_list.needs_confirmation(public_id, game_data):
+                return 'completed'
         elif game_data.data_available:
-            game = RunningGame(public_id=public_id, mainframe=self)
-            self.assign_game_variables(game, public_id, game_data)
-            self.running_games.add_widget(game)
-
-    def assign_game_variables(self, game, public_id, game_data):
-        game.team_a_name = game_data.teams['A'].name
-        game.team_a_score = game_data.teams['A'].score_str
-        game.team_b_name = game_data.teams['B'].name
-        game.team_b_score = game_data.teams['B'].score_str
-        self.games[public_id] = game
-
-    def confirm(self, ui_game):
-        admin_game = self.games_list.games_by_public_id[ui_game.public_id]
-        watcher_game = self.watcher.game_data[ui_game.public_id]
-        admin_game.team_a_points = watcher_game.teams['A'].points_total
-        admin_game.team_a_snitch = ['', '*'][watcher_game.teams['A'].snitch_caught]
-        admin_game.team_b_points = watcher_game.teams['B'].points_total
-        admin_game.team_b_snitch = ['', '*'][watcher_game.teams['B'].snitch_caught]
-        self.games_list.update_all()
-        ui_game.parent.remove_widget(ui_game)
-        del self.games[ui_game.public_id]
+            return 'running'
+        return None
 
-    def request_reset(self, game):
-        self.requesting_reset = game
+    def game_variables(self, game_data):
+        return {
+            'team_a_name': game_data.teams['A'].name,
+            'team_a_score': game_data.teams['A'].score_str,
+            'team_b_name': game_data.teams['B'].name,
+            'team_b_score': game_data.teams['B'].score_str,
+        }
+
+    def add_row(self, kind, public_id, game_data):
+        row = {'public_id': public_id, 'mainframe': self, 'button_disabled': False, **self.game_variables(game_data)}
+        view = self.row_views[kind]
+        self.row_indices[kind][public_id] = len(view.data)
+        view.data.append(row)
+        self.game_rows[public_id] = (kind, row)
+        self.update_row_counts()
+
+    def update_row(self, public_id, **changes):
+        kind, row = self.game_rows[public_id]
+        row.update(changes)
+        self.row_views[kind].data[self.row_indices[kind][public_id]] = row
+
+    def remove_row(self, public_id):
+        if public_id not in self.game_rows:
+            return
+        kind, _row = self.game_rows.pop(public_id)
+        view = self.row_views[kind]
+        del view.data[self.row_indices[kind].pop(public_id)]
+        self.row_indices[kind] = {row['public_id']: index for index, row in enumerate(view.data)}
+        self.update_row_counts()
+
+    def update_row_counts(self):
+        self.completed_count = len(self.row_indices['completed'])
+        self.running_count = len(self.row_indices['running'])
+        metrics.UI_ROWS.set(self.completed_count, 'completed')
+        metrics.UI_ROWS.set(self.running_count, 'running')
+
+    def confirm(self, public_id):
+        self.games_list.confirm(public_id, self.watcher.game_data[public_id])
+        self.remove_row(public_id)
+
+    def request_reset(self, public_id):
+        self.update_row(public_id, button_disabled=True)
+        self.requesting_reset = self.game_rows[public_id][1]
 
     def accept_reset(self):
-        game = self.games_list.games_by_public_id[self.requesting_reset.public_id]
-        game.reset_timekeeper()
+        public_id = self.requesting_reset['public_id']
+        game = self.games_list.games_by_public_id.get(public_id)
         self.requesting_reset = None
+        if game is None:
+            print(f'{public_id} is not in the imported schedule, cannot reset it')
+            self.reset_failed(public_id)
+            return
+        self.actions.submit(f'reset {public_id}', game.reset_timekeeper,
+                            on_error=lambda _e: self.reset_failed(public_id))
+
+    def reset_failed(self, public_id):
+        if public_id in self.game_rows:
+            self.update_row(public_id, button_disabled=False)
 
     def deny_reset(self):
-        self.requesting_reset.reset_denied()
+        public_id = self.requesting_reset['public_id']
+        if public_id in self.game_rows:
+            self.update_row(public_id, button_disabled=False)
         self.requesting_reset = None
 
     def import_schedule(self):
-        self.games_list.import_all()
-        print('Schedule imported')
+        self.actions.submit('import', self.games_list.load, on_done=lambda _r: print('Schedule imported'))
 
     def export_schedule(self):
-        self.games_list.write_to_live_admin()
-        print('Schedule exported')
+        self.actions.submit('export_schedule', self.games_list.write_to_live_admin, True,
+                            on_done=lambda _r: print('Schedule exported'))
 
     def export_results(self):
-        self.games_list.write_to_google()
-        print('Results exported')
+        self.actions.submit('export_results', self.games_list.write_to_google, True,
+                            on_done=lambda _r: print('Results exported'))
 
     def create_betting_form(self):
         form_name = self.betting_text_input.text
+        split_by = BETTING_SPLITS[self.betting_split.text]
         self.betting_modal.opacity = 0
         self.betting_text_input.text = ""
-        print(self.games_list.create_betting_form(form_name, deadlines=True))
-        self.games_list.write_to_google()
+        # Creating a form is not idempotent, so a failed attempt is not repeated
+        self.actions.submit('betting_form', self.games_list.create_betting_form, form_name, True, split_by,
+                            on_done=self.betting_form_created, retries=0)
+
+    def betting_form_created(self, result):
+        print(result)
+        self.games_list.update_all()
 
     def show_betting_form(self):
         self.betting_modal.opacity = 1
@@ -106,52 +240,57 @@ class MainFrame(BoxLayout):
         self.betting_text_input.text = ""
 
 
-class UIGame(BoxLayout):
+class UIGame(RecycleDataViewBehavior, BoxLayout):
     button_color = ColorProperty()
     button_text = StringProperty()
     button = ObjectProperty(None)
     score_color = ColorProperty()
+    public_id = StringProperty()
     team_a_name = StringProperty()
     team_b_name = StringProperty()
     team_a_score = StringProperty()
     team_b_score = StringProperty()
+    button_disabled = BooleanProperty(False)
+    mainframe = ObjectProperty(None)
 
 
 class CompletedGame(UIGame):
     def __init__(self, **kwargs):
-        self.public_id = kwargs.pop('public_id')
-        self.mainframe = kwargs.pop('mainframe')
         super().__init__(**kwargs)
         self.button_color = [0.15, 1, 0.15, 1]
         self.button_text = "Confirm"
         self.score_color = [1, 1, 1, 1]
 
     def button_pressed(self):
-        self.mainframe.confirm(self)
+        self.mainframe.confirm(self.public_id)
 
 
 class RunningGame(UIGame):
     def __init__(self, **kwargs):
-        self.public_id = kwargs.pop('public_id')
-        self.mainframe = kwargs.pop('mainframe')
         super().__init__(**kwargs)
         self.button_color = [1, 0.15, 0.15, 1]
         self.button_text = "Reset"
         self.score_color = [0.15, 1, 0.15, 1]
 
     def button_pressed(self):
-        self.mainframe.request_reset(self)
-        self.button.disabled = True
-
-    def reset_denied(self):
-        self.button.disabled = False
+        self.mainframe.request_reset(self.public_id)
 
 
 class TimekeeperApp(App):
     def __init__(self, **kwargs):
         self.games_list = kwargs.pop('games_list')
         self.watcher = kwargs.pop('watcher')
+        self.profiler = kwargs.pop('profiler', None)
+        self.startup = kwargs.pop('startup', None)
         super().__init__(**kwargs)
 
     def build(self):
-        return MainFrame(games_list=self.games_list, watcher=self.watcher)
+        return MainFrame(games_list=self.games_list, watcher=self.watcher, startup=self.startup)
+
+    def on_start(self):
+        if self.profiler:
+            self.profiler.start_main_loop(Clock)
+
+    def on_stop(self):
+        # Pending actions are dropped, so closing the window doesn't wait for queued Google requests
+        self.root.actions.close(wait=False, cancel_futures=True)
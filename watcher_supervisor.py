@@ -0,0 +1,211 @@
+import multiprocessing
+import threading
+import time
+
+import game
+import game_log
+import games_watcher
+import listener_registry
+import metrics
+
+READY_TIMEOUT = 30
+CONNECT_RETRY_DELAY = 15
+WORKER_CHECK_INTERVAL = 5
+
+
+class WatcherSupervisor:
+    def __init__(self, shards, log_directory=game_log.LOG_DIRECTORY):
+        self.shards = shards
+        self.log_directory = log_directory
+        self.listeners = listener_registry.ListenerRegistry()
+        self.game_data = {}
+        # Held while mirror games change, like GamesWatcher.state_lock
+        self.state_lock = threading.RLock()
+        self.messages = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        self.workers = []
+        self.workers_lock = threading.Lock()
+        self.pump_thread = None
+        # Indices of the shards whose connection is up; a shard restored from its checkpoint announces its games
+        # before that, and possibly twice
+        self.ready_shards = set()
+        # shard index -> why it is not connected yet, as reported by the worker or found by check_workers()
+        self.shard_errors = {}
+        self.restarts = 0
+        self.ready = threading.Event()
+
+    @classmethod
+    def for_tournaments(cls, tournament_ids, **kwargs):
+        return cls([{'tournament_id': tournament_id} for tournament_id in tournament_ids], **kwargs)
+
+    @classmethod
+    def for_public_ids(cls, public_ids, shard_count, **kwargs):
+        return cls([{'public_ids': public_ids[index::shard_count]} for index in range(shard_count)], **kwargs)
+
+    @property
+    def public_ids(self):
+        return list(self.game_data)
+
+    def listen(self, event, callback, *args, public_id=None, team=None):
+        return self.listeners.subscribe(event, callback, *args, public_id=public_id, team=team)
+
+    def unlisten(self, subscription):
+        self.listeners.unsubscribe(subscription)
+
+    def emit(self, event_game, event):
+        start = time.perf_counter()
+        self.listeners.emit(event_game, event)
+        metrics.observe_stage('emit', start)
+
+    def start(self, wait=True):
+        self.workers = [self._start_worker(index) for index in range(len(self.shards))]
+        self.pump_thread = threading.Thread(target=self._pump, name='WatcherSupervisor', daemon=True)
+        self.pump_thread.start()
+        threading.Thread(target=self._monitor_workers, name='WatcherSupervisorMonitor', daemon=True).start()
+        if wait:
+            self.ready.wait(READY_TIMEOUT)
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while not self.ready.wait(min(1, max(deadline - time.monotonic(), 0))):
+            self.check_workers()
+            if time.monotonic() >= deadline:
+                raise TimeoutError(self.status_text())
+
+    def check_workers(self):
+        # Workers retry their own connection, so one that exited crashed; it is started again from its checkpoint
+        with self.workers_lock:
+            for index, worker in enumerate(self.workers):
+                if worker.is_alive() or self.stop_event.is_set():
+                    continue
+                with self.state_lock:
+                    self.ready_shards.discard(index)
+                    self.ready.clear()
+                    self.shard_errors[index] = f"died with exit code {worker.exitcode}, restarted"
+                print(f'Shard {index} died with exit code {worker.exitcode}, restarting it')
+                self.restarts += 1
+                self.workers[index] = self._start_worker(index)
+
+    def _monitor_workers(self):
+        while not self.stop_event.wait(WORKER_CHECK_INTERVAL):
+            self.check_workers()
+
+    def status_text(self):
+        with self.state_lock:
+            errors = dict(self.shard_errors)
+            connected = len(self.ready_shards)
+        parts = [f"{connected} of {len(self.shards)} shards connected"]
+        parts += [f"shard {index} {error}" for index, error in sorted(errors.items())]
+        return ', '.join(parts)
+
+    def _start_worker(self, index):
+        worker = multiprocessing.Process(
+            target=run_worker, args=(self.shards[index], self.messages, self.stop_event, self.log_directory, index),
+            name=f'GamesWatcherShard-{index}', daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def _pump(self):
+        while True:
+            message = self.messages.get()
+            if message is None:
+                return
+            kind, payload = message
+            with self.state_lock:
+                self._apply_message(kind, payload)
+
+    def _apply_message(self, kind, payload):
+        match kind:
+            case 'public_ids':
+                for public_id, state in payload:
+                    mirror = self.game_data.get(public_id)
+                    if mirror is None:
+                        mirror = self.game_data[public_id] = game.Game(self, public_id)
+                    mirror.restore_state(state)
+                self.emit(None, ('public_ids',))
+            case 'connected':
+                self.ready_shards.add(payload)
+                self.shard_errors.pop(payload, None)
+                if len(self.ready_shards) >= len(self.shards):
+                    self.ready.set()
+            case 'connect_failed':
+                index, error = payload
+                self.shard_errors[index] = f"could not connect ({error}), retrying"
+            case 'update':
+                for public_id, state, events in payload:
+                    mirror = self.game_data[public_id]
+                    mirror.restore_state(state)
+                    for event in events:
+                        self.emit(mirror, event)
+
+    def close(self, timeout=10):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self.messages.put(None)
+        if self.pump_thread:
+            self.pump_thread.join(timeout)
+
+
+class ShardWatcher(games_watcher.GamesWatcher):
+    def __init__(self, messages, log_directory, shard_index):
+        self.messages = messages
+        self.pending_events = []
+        super().__init__(log_directory, f"checkpoint_shard{shard_index}.pickle")
+
+    @games_watcher.GamesWatcher.public_ids.setter
+    def public_ids(self, new_public_ids):
+        games_watcher.GamesWatcher.public_ids.fset(self, new_public_ids)
+        self.messages.put(('public_ids', [
+            (public_id, shard_game.current_state()) for public_id, shard_game in self.game_data.items()
+        ]))
+
+    def dispatch(self, event, data):
+        # Resyncs dispatch from their own threads, so the events are collected under the same lock they are
+        # produced under
+        with self.state_lock:
+            super().dispatch(event, data)
+            if event == 'all games at once':
+                public_ids = [game_data['public_id'] for game_data in data['data']]
+            else:
+                public_ids = [data['public_id']]
+            update = []
+            for public_id in public_ids:
+                shard_game = self.game_data.get(public_id)
+                if shard_game is None:
+                    continue
+                events = [pending for event_public_id, pending in self.pending_events if event_public_id == public_id]
+                update.append((public_id, shard_game.current_state(), events))
+            self.pending_events = []
+        if update:
+            self.messages.put(('update', update))
+
+    def emit(self, event_game, event):
+        if event_game is None:
+            # The supervisor announces new public ids itself once the 'public_ids' message arrives
+            return
+        self.pending_events.append((event_game.public_id, event))
+        super().emit(event_game, event)
+
+
+def run_worker(shard, messages, stop_event, log_directory, shard_index):
+    watcher = ShardWatcher(messages, log_directory, shard_index)
+    # Like the startup task of the single process watcher, the connection is retried until it is up
+    while not stop_event.is_set():
+        try:
+            if 'tournament_id' in shard:
+                watcher.connect_tournament_id(shard['tournament_id'])
+            else:
+                watcher.connect_public_ids(shard['public_ids'])
+        except Exception as e:
+            print(f'Shard {shard_index} could not connect, retrying in {CONNECT_RETRY_DELAY}s:', e)
+            messages.put(('connect_failed', (shard_index, str(e))))
+            stop_event.wait(CONNECT_RETRY_DELAY)
+            continue
+        messages.put(('connected', shard_index))
+        break
+    stop_event.wait()
+    watcher.close()